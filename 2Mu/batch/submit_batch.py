@@ -27,7 +27,10 @@ def wrapper(args):
 
     # split inputfile into temp input files
     for dname, d in dataset_map.iteritems():
-        split_input_file(d, tmpdir)
+        if args.balance:
+            plan_balanced_jobs(d, tmpdir)
+        else:
+            split_input_file(d, tmpdir)
 
     # build options map for sub scripts
     options = {
@@ -115,6 +118,8 @@ def parse_command_line(argv):
         required=True)
     parser.add_argument('--mail', action='store_true',
         help='Send mail upon job completion')
+    parser.add_argument('--balance', action='store_true',
+        help='Split datasets into jobs with equal numbers of events')
 
     return parser.parse_args(argv)
 
@@ -10,13 +10,15 @@ from AnalysisToolLight.AnalysisTool.AnalysisBase import AnalysisBase
 from AnalysisToolLight.AnalysisTool.AnalysisBase import main as analysisBaseMain
 from AnalysisToolLight.AnalysisTool.Preselection import get_event_category
 from AnalysisToolLight.AnalysisTool.histograms import fill_category_hists
-from cuts import vh_cuts
+from cuts import vh_cuts, vh_cut_configurations
 
 ## ___________________________________________________________
 class Ana2Mu(AnalysisBase):
     def __init__(self, args):
 
         self.cuts = vh_cuts
+        # working points that can be run together (--cut-configs)
+        self.cut_configurations = vh_cut_configurations
 
         super(Ana2Mu, self).__init__(args)
 
@@ -161,6 +163,13 @@ class Ana2Mu(AnalysisBase):
         # add it to the extra histogram map
         self.extra_histogram_map['control'] = self.histograms_categories_ctrl
 
+        # each cut configuration (--cut-configs) has its own histograms
+        #     and counters
+        self.config_attributes += ['histograms_ctrl', 'histograms_categories',
+            'histograms_categories_ctrl', 'fnumCat0', 'fnumCat1', 'fnumCat2',
+            'fnumCat3', 'fnumCat4', 'fnumCat5', 'fnumBucket',
+            'nMultipleDimuEvents', 'nSyncEvents']
+
         ##########################################################
 
 
@@ -207,7 +216,7 @@ class Ana2Mu(AnalysisBase):
         pairindex1, pairindex2 = self.dimuon_pairs[0]
         muon1 = self.good_muons[pairindex1]
         muon2 = self.good_muons[pairindex2]
-        dimuonobj = muon1.p4() + muon2.p4()
+        dimuonobj = muon1.four_vector() + muon2.four_vector()
 #
 #        # pick which inv mass to put in limit tree
 #
@@ -235,7 +244,8 @@ class Ana2Mu(AnalysisBase):
             and self.met.et() < self.cuts['VBF_met']):
 
 
-            thisdijetmass = (self.good_jets[0].p4() + self.good_jets[1].p4()).M()
+            thisdijetmass = (self.good_jets[0].four_vector()
+                + self.good_jets[1].four_vector()).M()
             thisdijetdeta = abs(self.good_jets[0].eta() - self.good_jets[1].eta())
 
             # VBFTight
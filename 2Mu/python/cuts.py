@@ -98,3 +98,14 @@ vh_cuts = {
 
 }
 
+
+
+# working points evaluated together in one pass with --cut-configs
+#     (e.g. --cut-configs nominal,medium2016,tightiso); each is vh_cuts with
+#     the changes listed
+vh_cut_configurations = {
+    'nominal'    : vh_cuts,
+    'medium2016' : dict(vh_cuts, cMuID='medium2016'),
+    'tightiso'   : dict(vh_cuts, cMuIsoLevel='tight'),
+    'CMVAv2T'    : dict(vh_cuts, cBJetAlg='CMVAv2T'),
+}
@@ -11,18 +11,99 @@ from ScaleFactors import *
 from xsec import xsecs
 from histograms import *
 from Preselection import *
+from Selection import compile_selection
+from CutConfigurations import make_configurations
+from MetadataCache import collect_metadata
+from BranchUsage import BranchUsage
+from ReadAhead import FilePrefetcher, configure_tree_cache
+from FileCache import FileCache, LocalDirectorySource
+from Skim import SkimWriter
+from ColumnarCache import ColumnarReader, ColumnarRow, ColumnarBatch
+from tools.tools import read_input_list, resolve_input_name
+from tools.tree_arrays import TreeBatch
 from prettytable import PrettyTable
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 ## _____________________________________________________________________________
 EventWeight = namedtuple('EventWeight', 
     'full base_event_weight pileup_factor trigger_factor lepton_factor')
 
+## _____________________________________________________________________________
+class EventBatch(object):
+    '''
+    Entries [first, last) of the current file, processed together with
+    --batch-size and given to per_batch_action:
+        tree    : the tree (or ColumnarRow) of the file, for GetEntry
+        arrays  : the branches of the entries as whole arrays
+                  (ColumnarCache.ColumnarBatch or tools.tree_arrays.TreeBatch)
+        passed  : mask of the events passing event selection and
+                  preselection
+        state   : the masks and counts of the selection steps
+                  (Selection.run_batch)
+        weights : base event weight times pileup factor of each event
+                  (see AnalysisBase.calculate_batch_weights)
+    '''
+    def __init__(self, tree, arrays, first, last):
+        self.tree = tree
+        self.arrays = arrays
+        self.first = first
+        self.last = last
+        self.size = last - first
+        self.passed = None
+        self.state = None
+        self.weights = None
+
+    def entries(self):
+        ''' Entry numbers of the events that passed '''
+        return [self.first + i for i in numpy.flatnonzero(self.passed).tolist()]
+
+## _____________________________________________________________________________
+# count branch of each collection
+COLLECTION_COUNTS = OrderedDict([
+    ('vertices',  'primvertex_count'),
+    ('muons',     'muon_count'),
+    ('electrons', 'electron_count'),
+    ('jets',      'ak4pfchsjet_count'),
+    ('met',       'pfmettype1_count'),
+    ('photons',   'photon_count'),
+    ('taus',      'tau_count'),
+])
+
+## _____________________________________________________________________________
+def lazy_collection(name):
+    '''
+    Property for collection name (self.muons etc.): built by
+    load_collection the first time it is used in an event, then kept until
+    the next event. Assigning to it replaces it for the rest of the event.
+    '''
+    def getter(self):
+        collections = self.collections
+        if name not in collections:
+            collections[name] = self.load_collection(name)
+        return collections[name]
+    def setter(self, value):
+        self.collections[name] = value
+    return property(getter, setter)
+
 ## _____________________________________________________________________________
 class AnalysisBase(object):
     '''
     You should derive your own class from AnalysisBase
     '''
+    # the collections of the current event
+    vertices  = lazy_collection('vertices')
+    muons     = lazy_collection('muons')
+    electrons = lazy_collection('electrons')
+    jets      = lazy_collection('jets')
+    met       = lazy_collection('met')
+    photons   = lazy_collection('photons')
+    taus      = lazy_collection('taus')
+
     ## _________________________________________________________________________
     def __init__(self, args):
         # set up logging info
@@ -42,44 +123,101 @@ class AnalysisBase(object):
         self.max_events = args.nevents
         self.skip_events = args.skipevents
         self.whichfile = args.whichfile
+        # global entry numbers (across the whole file list) to process;
+        #     --skipevents N is the same as --first-entry N
+        self.first_entry = args.first_entry
+        if self.first_entry == -1 and self.skip_events != -1:
+            self.first_entry = self.skip_events
+        self.last_entry = args.last_entry
         self.data_dir   = ('{0}/src/AnalysisToolLight/AnalysisTool'
             '/data'.format(os.environ['CMSSW_BASE']))
+        # read-ahead options
+        self.read_cache_mb = args.read_cache_mb
+        self.prefetch = args.prefetch
+        self.warm_mb = args.warm_mb
+        # local copies of remote input files
+        self.file_cache = None
+        if args.file_cache_dir:
+            self.file_cache = FileCache(args.file_cache_dir,
+                int(args.file_cache_gb*1024*1024*1024),
+                LocalDirectorySource(args.file_cache_source)
+                    if args.file_cache_source else None)
+        # read the event tree from a columnar cache (see ColumnarCache.py)
+        self.columnar_cache = args.columnar_cache
+        if self.columnar_cache and (args.write_skim or args.record_branches
+            or args.prune_branches):
+            raise ValueError('--columnar-cache can\'t be used with '
+                '--write-skim, --record-branches or --prune-branches.')
+        # process the events in chunks of this many entries, as arrays
+        #     (0: one event at a time)
+        self.batch_size = args.batch_size
+        self.batch_branches = set()
+        self.deferred_batches = []
+        if self.batch_size > 0 and (args.write_skim or args.record_branches):
+            raise ValueError('--batch-size can\'t be used with --write-skim '
+                'or --record-branches.')
+        # cut configurations (from self.cut_configurations) to evaluate
+        #     in one pass (see CutConfigurations.py)
+        self.config_names = ([name for name in args.cut_configs.split(',')
+            if name] if args.cut_configs else [])
+        if self.config_names and args.write_skim:
+            raise ValueError('--cut-configs can\'t be used with '
+                '--write-skim.')
+        # cache derived quantities of Dataform objects within an event
+        memo_settings.enabled = not args.no_memo
         # outputs
         self.output = args.output_filename
-
-        # put file names into a list called self.filenames
-        with open(input_file_list,'r') as f:
-            for line in f.readlines():
-                fname_ = line.strip()
-                if fname_.startswith('#'): continue
-                if not fname_: continue
-
-                # personal storage options
-                if fname_.startswith('T2_CH_CERN'):
-                    fname_ = 'root://eoscms.cern.ch/{0}'.format(fname_[10:])
-                elif fname_.startswith('T2_US_UCSD'):
-                    fname_ = 'root://xrootd.t2.ucsd.edu/{0}'.format(fname_[10:])
-
-                self.filenames += [fname_]
+        # skim of the events passing preselection (see Skim.py)
+        self.skim_path = args.write_skim
+        self.skim = None
+
+        # record which branches are read, or only read the ones recorded
+        if args.record_branches and args.prune_branches:
+            raise ValueError('--record-branches and --prune-branches can\'t '
+                'be used together.')
+        self.branch_usage = None
+        if args.record_branches:
+            self.branch_usage = BranchUsage('record', args.record_branches)
+        elif args.prune_branches:
+            self.branch_usage = BranchUsage('prune', args.prune_branches)
+
+        # put file names into a list called self.filenames. lines of job
+        #     lists made by batch_helper.plan_balanced_jobs can also give
+        #     the (inclusive) range of entries to process in that file
+        self.file_entry_limits = []
+        for name, first, last in read_input_list(input_file_list):
+            self.filenames += [resolve_input_name(name)]
+            self.file_entry_limits += [(first, last)]
 
 
         logging.info('Assembling job information...')
+        # read (or look up in the metadata cache) what we need from
+        #     the info and lumi trees of every input file
+        self.metadata_cache = ('' if args.no_metadata_cache
+            else args.metadata_cache or
+            '{0}/metadata/metadata_cache.json'.format(self.data_dir))
+        file_metadata = collect_metadata(self.filenames, self.treedir,
+            self.infoname, self.luminame, self.treename, self.metadata_cache,
+            args.scan_workers)
+
+        # drop files that couldn't be read (they are listed in the log)
+        self.filenames = [fname for fname, info
+            in zip(self.filenames, file_metadata) if info is not None]
+        self.file_entry_limits = [limits for limits, info
+            in zip(self.file_entry_limits, file_metadata) if info is not None]
+        self.file_metadata = [info for info in file_metadata
+            if info is not None]
+        if not self.filenames:
+            raise IOError('None of the input files in {0} could be '
+                'read.'.format(input_file_list))
+
         # things we will check in the first file
-        self.cmsswversion = ''
-        self.dataset_source = ''
-        self.isdata = None
-        # open first file and load info tree
-        tfile0 = TFile.Open(self.filenames[0])
-        infotree = tfile0.Get('{0}/{1}'.format(self.treedir, self.infoname))
-        infotree.GetEntry(0)
-        self.isdata = bool(infotree.isdata)
+        self.isdata = self.file_metadata[0]['isdata']
         self.ismc = not self.isdata
-        self.cmsswversion = str(infotree.CMSSW_version)
+        self.cmsswversion = str(self.file_metadata[0]['cmsswversion'])
         # strip " and / from parent dataset name
-        self.dataset_source = ''.join(c for c in str(infotree.source_dataset)
-            if c not in '"/')
-
-        tfile0.Close('R')
+        self.dataset_source = ''.join(c for c in
+            str(self.file_metadata[0]['source_dataset']) if c not in '"/')
 
         # get short CMSSW version that was used to produce these
         self.cmsswversion = ''.join(self.cmsswversion.split('_')[1:3] + ['X'])
@@ -95,31 +233,36 @@ class AnalysisBase(object):
             logging.info('       *   ')
             self.nom_xsec = -1.
 
-        # set up lumi info and see how many events we have to process
-        infochain = TChain('{0}/{1}'.format(self.treedir, self.infoname))
-        self.nevents_to_process  = 0
-        # find original sum weights
-        lumichain = TChain('{0}/{1}'.format(self.treedir, self.luminame))
+        # add up lumi info to find total number of events, summed event
+        #     weights, and how many events we have to process
         self.numlumis   = 0
+        self.numinfos   = 0
         self.sumweights = 0
         self.nevents    = 0
-        for f, fname in enumerate(self.filenames):
-            logging.info('Adding file {0}: {1}'.format(f+1, fname))
-            lumichain.Add(fname)
-            infochain.Add(fname)
-        # iterate over lumis to find total number of events
-        #     and summed event weights
-        logging.info('')
-        logging.info('Counting events and lumiblocks...')
-        self.numlumis = lumichain.GetEntries()
-        self.numinfos = infochain.GetEntries()
-        for entry in xrange(self.numlumis):
-            lumichain.GetEntry(entry)
-            self.nevents += lumichain.lumi_nevents
-            self.sumweights += lumichain.lumi_sumweights
-        for entry in xrange(self.numinfos):
-            infochain.GetEntry(entry)
-            self.nevents_to_process += infochain.nevents_filled
+        self.nevents_to_process = 0
+        for info, (first, last) in zip(self.file_metadata,
+            self.file_entry_limits):
+            # a file split over several jobs has its lumi info counted only
+            #     by the job that starts at its first entry, so that adding
+            #     up the summary trees of all jobs gives the right totals
+            if first > 0: continue
+            self.numlumis   += info['numlumis']
+            self.numinfos   += info['numinfos']
+            self.nevents    += info['nevents']
+            self.sumweights += info['sumweights']
+            self.nevents_to_process += info['nevents_filled']
+
+        # work out which entries of which files to process
+        self.entry_ranges = self.find_entry_ranges()
+        self.processes_slice = (self.first_entry != -1
+            or self.last_entry != -1 or self.whichfile != -1
+            or any(first != -1 for first, last in self.file_entry_limits))
+        if self.processes_slice:
+            self.nevents_to_process = sum(last - first
+                for f, fname, first, last in self.entry_ranges)
+            logging.info('Processing a slice of the input: {0} entries '
+                'in {1} files'.format(self.nevents_to_process,
+                    len(self.entry_ranges)))
 
         logging.info(('    Number of events found: {0} in {1} lumi sections '
             'in {2} files').format(self.nevents_to_process, self.numlumis, 
@@ -135,6 +278,9 @@ class AnalysisBase(object):
 
 
 
+        # collections of the current event (see lazy_collection)
+        self.collections = {}
+
         # initialize map of histograms as empty
         self.histograms = histograms
         self.extra_histogram_map = {}
@@ -160,6 +306,11 @@ class AnalysisBase(object):
         self.jet_shift_down = None
         self.jet_shift_up   = None
 
+        # b-tag working points and tau discriminators used by the analysis
+        #     (besides cuts['cBJetAlg']), checked in each file before its loop
+        self.btag_names = []
+        self.tau_discriminator_names = []
+
         # summary tree
         self.summary_tree = TTree('Summary', 'Summary')
         # branches of summary tree
@@ -179,9 +330,17 @@ class AnalysisBase(object):
         # initialize output file
         self.outfile = TFile(self.output,'RECREATE')
 
-        # initialize event counters
+        # event selection and preselection, and the event counters
+        self.selection = compile_selection(self.cuts)
         self.cutflow = initialize_cutflow(self)
 
+        # attributes that each cut configuration has its own copy of; derived
+        #     classes add their own histogram maps and counters
+        self.config_attributes = ['cuts', 'selection', 'cutflow',
+            'histograms', 'extra_histogram_map', 'category_trees']
+        self.configurations = []
+        self.configuration = None
+
 
     ## _________________________________________________________________________
     def analyze(self):
@@ -225,7 +384,7 @@ class AnalysisBase(object):
                 logging.info('')
                 logging.info('Loading jet correction uncertainty info...')
                 jec_unc_filename = '{0}/systematics/jetshifts_{1}.root'.format(
-                    self.datadir, self.cmsswversion)
+                    self.data_dir, self.cmsswversion)
                 if not os.path.exists(jec_unc_filename):
                     logging.info('       *   ')
                     logging.info('    *******')
@@ -234,12 +393,14 @@ class AnalysisBase(object):
                     logging.info('    *******')
                     logging.info('       *   ')
                 else:
+                    # the histograms are copied into lookup tables, so the
+                    #     file can be closed right away
                     jec_unc_f = TFile.Open(jec_unc_filename)
-                    self.jet_shift_down = TH2F(jec_unc_f.Get(
-                        'hJetShift_MC_Down').Clone('jec_shift_down'))
-                    self.jet_shift_up   = TH2F(jec_unc_f.Get(
-                        'hJetShift_MC_Up').Clone('jec_shift_up'))
-                    jec_unc_f.Close('R')
+                    self.jet_shift_down = JetShiftTable(jec_unc_f.Get(
+                        'hJetShift_MC_Down'))
+                    self.jet_shift_up   = JetShiftTable(jec_unc_f.Get(
+                        'hJetShift_MC_Up'))
+                    jec_unc_f.Close()
 
 
         ##########################################################
@@ -248,8 +409,46 @@ class AnalysisBase(object):
         #                                                        #
         ##########################################################
         self.eventsprocessed = 0
+        # one set of cuts, selection, cutflow and outputs per configuration
+        self.configurations = make_configurations(self, self.config_names)
+        if self.config_names:
+            logging.info('')
+            logging.info('Evaluating cut configurations: {0}'.format(
+                ', '.join(self.config_names)))
+        # skims don't have the events that failed the selection: add back
+        #     what those events added to the cutflow when the skim was made
+        for config in self.configurations:
+            cutflow = config.attributes['cutflow']
+            for info, (first, last) in zip(self.file_metadata,
+                self.file_entry_limits):
+                if not info.get('skim_cutflow') or first > 0: continue
+                for name, count in info['skim_cutflow'].iteritems():
+                    if name in cutflow.counters:
+                        cutflow.counters[name] += count
+        self.use_configuration(self.configurations[0])
+        if self.skim_path:
+            self.skim = SkimWriter(self.skim_path, self.treedir, self.treename,
+                self.infoname, self.luminame)
         # how often (in number of events) should we print out progress updates?
-        updateevery = 1000
+        self.update_every = 1000
+        self.starttime = time.time()
+
+        # objects of each collection are reused from event to event
+        self.pools = OrderedDict([
+            ('vertices',  CollectionPool(Vertex)),
+            ('muons',     CollectionPool(Muon,
+                self.use_rochester_corrections)),
+            ('electrons', CollectionPool(Electron)),
+            ('jets',      CollectionPool(Jet, self.jet_shift,
+                self.jet_shift_down, self.jet_shift_up)),
+            ('met',       CollectionPool(PFMETTYPE1)),
+            ('photons',   CollectionPool(Photon)),
+            ('taus',      CollectionPool(Tau)),
+        ])
+
+        # the opener that prefetches the next file
+        prefetcher = FilePrefetcher('{0}/{1}'.format(self.treedir,
+            self.treename), self.prefetch, self.warm_mb, self.file_cache)
 
         ##########################################################
         #                                                        #
@@ -257,126 +456,74 @@ class AnalysisBase(object):
         #                                                        #
         ##########################################################
         # loop over each input file
-        for f, fname in enumerate(self.filenames):
-
-            if self.whichfile != -1 and f+1 != self.whichfile: continue
+        for n, (f, fname, first, last) in enumerate(self.entry_ranges):
 
             logging.info('')
             logging.info('Processing file {0} of {1}:'.format(f+1,
                 len(self.filenames)))
-            # open the file and get the AC1B tree
-            tfile = TFile.Open(fname)
-            tree = tfile.Get('{0}/{1}'.format(self.treedir, self.treename))
-
-            # loop over each event (row)
-            for row in tree:
-                # debug
-                if (self.skip_events != -1
-                    and self.eventsprocessed < self.skip_events):
-                    continue
-                if (self.max_events is not -1
-                    and self.eventsprocessed >= self.max_events):
-                    break
-
-                self.eventsprocessed += 1
-
-                # progress updates
-                if self.eventsprocessed == 2:
-                    starttime = time.time()
-                elif self.eventsprocessed == updateevery:
-                    logging.info('  Processing event '
-                        '{0}/{1} ({2:0.0f}%) '.format(
-                            self.eventsprocessed,
-                            self.nevents_to_process,
-                            (100.*self.eventsprocessed)/self.nevents_to_process)
-                    )
-                if (self.eventsprocessed > updateevery
-                    and self.eventsprocessed % updateevery == 0):
-                    currenttime = time.time()
-                    timeelapsed = currenttime - starttime
-                    timeleft = ((float(self.nevents_to_process)
-                        - float(self.eventsprocessed)) * (float(timeelapsed)
-                        / float(self.eventsprocessed)))
-                    minutesleft, secondsleft = divmod(int(timeleft), 60)
-                    hoursleft, minutesleft = divmod(minutesleft, 60)
-                    logging.info('  Processing event '
-                        '{0}/{1} ({2:0.0f}%) [{3}:{4:02d}:{5:02d}]'.format(
-                            self.eventsprocessed,
-                            self.nevents_to_process,
-                            (100.*self.eventsprocessed)/self.nevents_to_process,
-                            hoursleft,
-                            minutesleft,
-                            secondsleft)
-                    )
-
-
-                # load required collections
-                self.event     = Event(row, self.sumweights)
-
-                self.vertices  = ([Vertex(row, i)
-                    for i in range(row.primvertex_count)])
-
-                self.muons     = ([Muon(row, i, self.use_rochester_corrections)
-                    for i in range(row.muon_count)]
-                    if hasattr(row,'muon_count') else [])
-                if self.use_rochester_corrections:
-                    self.muons.sort(key=lambda m: m.pt_roch(), reverse=True)
-
-                self.electrons = ([Electron(row, i)
-                    for i in range(row.electron_count)]
-                    if hasattr(row,'electron_count') else [])
-
-                self.jets      = ([Jet(row, i, self.jet_shift,
-                    self.jet_shift_down, self.jet_shift_up)
-                    for i in range(row.ak4pfchsjet_count)]
-                    if hasattr(row,'ak4pfchsjet_count') else [])
-
-                # MET is a vector of size 1
-                self.met       = (PFMETTYPE1(row, 0)
-                    if hasattr(row,'pfmettype1_count') else [])
-
-                # load optional collections
-                self.photons   = ([Photon(row, i)
-                    for i in range(row.photon_count)]
-                    if hasattr(row,'photon_count') else [])
-
-                self.taus      = ([Tau(row, i)
-                    for i in range(row.tau_count)]
-                    if hasattr(row,'tau_count') else [])
-
-                # set up containers for good objects
-                self.good_vertices  = []
-                self.good_muons     = []
-                self.good_electrons = []
-                self.good_jets      = []
-                self.good_bjets     = []
-
-                self.dimuon_pairs     = []
-                self.dielectron_pairs = []
-                self.dijet_pairs      = []
-
-                # do the event analysis!
-
-                self.cutflow.increment('nEv_Skim')
-
-                # check basic event selection
-                passes_event_selection = check_event_selection(self)
-                if not passes_event_selection: continue
-
-                # check all-category preselection
-                passes_preselection = check_preselection(self)
-                if not passes_preselection:
-                    #pass
-                    continue
-
-                # call the per_event_action method
-                #     (which is overridden in the derived class)
-                self.per_event_action()
+            if self.columnar_cache:
+                # memory-mapped arrays instead of the ROOT file
+                tfile = None
+                reader = ColumnarReader(self.columnar_cache, fname)
+                tree = row = ColumnarRow(reader)
+            else:
+                tfile, tree, row = self.open_tree(prefetcher, n, fname,
+                    first, last)
+            if self.skim:
+                self.skim.open_file(tfile, tree,
+                    self.file_entry_limits[f][0] <= 0)
+            if last - first != tree.GetEntries():
+                logging.info('    Entries {0} to {1} of {2}'.format(first,
+                    last-1, tree.GetEntries()))
+            # the event object only holds the row, so one per file will do
+            self.event = Event(row, self.sumweights)
+            self.row = row
+            # collections (other than the vertices) can be missing
+            self.available_collections = set(name for name, count
+                in COLLECTION_COUNTS.iteritems()
+                if name == 'vertices' or hasattr(row, count))
+            self.check_tagger_names(row)
+
+            if self.batch_size > 0:
+                # loop over chunks of entries, as arrays
+                for lo in xrange(first, last, self.batch_size):
+                    hi = min(lo + self.batch_size, last)
+                    if self.max_events is not -1:
+                        hi = min(hi, lo + self.max_events
+                            - self.eventsprocessed)
+                    if hi <= lo: break
+                    if self.columnar_cache:
+                        arrays = ColumnarBatch(reader, lo, hi)
+                    else:
+                        # the branches the last batches used are read
+                        #     together, a few per TTree::Draw
+                        arrays = TreeBatch(tree, lo, hi,
+                            sorted(self.batch_branches))
+                    self.process_batch(tree, arrays, lo, hi)
+                    if not self.columnar_cache:
+                        self.batch_branches.update(arrays.branches_read())
+            else:
+                # loop over each event (row)
+                for entry in xrange(first, last):
+                    if (self.max_events is not -1
+                        and self.eventsprocessed >= self.max_events):
+                        break
+                    self.process_event(tree, entry)
+
+            # done with this file (drops any baskets it had in memory)
+            if tfile: tfile.Close()
 
             if (self.max_events is not -1
                 and self.eventsprocessed >= self.max_events):
                 break
 
+        logging.info('')
+        logging.info('Total time spent waiting for input files to open: '
+            '{0:0.2f} s'.format(prefetcher.total_wait()))
+        if self.file_cache: self.file_cache.log_stats()
+        if self.skim: self.skim.close(self.cutflow, self.summary_tree)
+        self.log_pool_stats()
+        self.log_memo_stats()
 
 
         ##########################################################
@@ -388,6 +535,299 @@ class AnalysisBase(object):
         self.end_job()
 
 
+    ## _________________________________________________________________________
+    def process_event(self, tree, entry):
+        '''
+        Reads entry of tree, runs event selection and preselection on it and
+        calls per_event_action if it passes.
+        '''
+        tree.GetEntry(entry)
+
+        self.eventsprocessed += 1
+        self.log_progress(self.eventsprocessed - 1)
+
+        # forget the collections of the last event: self.muons etc.
+        #     are loaded when they are first used (load_collection),
+        #     so events that fail early never build the rest. all cut
+        #     configurations use the same ones
+        self.collections.clear()
+
+        for config in self.configurations:
+            self.use_configuration(config)
+            self.reset_good_objects()
+
+            # do the event analysis!
+
+            if self.skim: self.skim.begin_event(self.cutflow)
+            self.cutflow.increment('nEv_Skim')
+
+            # check basic event selection and all-category preselection
+            if not self.selection.run(self): continue
+
+            if self.skim: self.skim.fill()
+
+            # call the per_event_action method
+            #     (which is overridden in the derived class)
+            self.per_event_action()
+
+
+    ## _________________________________________________________________________
+    def process_batch(self, tree, arrays, first, last):
+        '''
+        Runs event selection and preselection on entries [first, last) of
+        tree at once (with --batch-size), from their arrays: for each cut
+        configuration fills the cutflow and an EventBatch (passed, state
+        and weights) and calls per_batch_action with it. The batches the
+        default per_batch_action hands back go through per_event_action
+        together (process_batch_events).
+        '''
+        self.eventsprocessed += last - first
+        self.log_progress(self.eventsprocessed - (last - first))
+
+        # all cut configurations use the same arrays
+        self.deferred_batches = []
+        for config in self.configurations:
+            self.use_configuration(config)
+            batch = EventBatch(tree, arrays, first, last)
+
+            self.cutflow.increment('nEv_Skim', batch.size)
+            batch.passed, batch.state = self.selection.run_batch(self,
+                batch.arrays)
+            batch.weights = self.calculate_batch_weights(batch)
+
+            # call the per_batch_action method
+            #     (by default per_event_action on each event that passed)
+            self.per_batch_action(batch)
+        if self.deferred_batches:
+            self.process_batch_events(self.deferred_batches)
+
+
+    ## _________________________________________________________________________
+    def process_batch_events(self, batches):
+        '''
+        Calls per_event_action for the events that passed in batches, a
+        list of (cut configuration, EventBatch) of the same entries: each
+        entry that passed for any configuration is read once, then for
+        each configuration it passed, the good objects and pairs are built
+        from that configuration's batch state (Selection.build_from_batch)
+        without running the selection again.
+        '''
+        passed = numpy.zeros(batches[0][1].size, dtype=bool)
+        for config, batch in batches: passed |= batch.passed
+        tree, first = batches[0][1].tree, batches[0][1].first
+        for index in numpy.flatnonzero(passed).tolist():
+            tree.GetEntry(first + index)
+            # the collections are shared by the configurations
+            self.collections.clear()
+            for config, batch in batches:
+                if not batch.passed[index]: continue
+                self.use_configuration(config)
+                self.reset_good_objects()
+                self.selection.build_from_batch(self, batch.state, index)
+                self.per_event_action()
+
+
+    ## _________________________________________________________________________
+    def use_configuration(self, config):
+        '''
+        Switches to the attributes (cuts, selection, cutflow, outputs) of
+        cut configuration config (see CutConfigurations.py).
+        '''
+        if config is self.configuration: return
+        # attributes like counters are replaced rather than changed, so
+        #     keep the current values
+        if self.configuration is not None:
+            for attr in self.config_attributes:
+                self.configuration.attributes[attr] = getattr(self, attr)
+        for attr, value in config.attributes.iteritems():
+            setattr(self, attr, value)
+        self.configuration = config
+
+
+    ## _________________________________________________________________________
+    def reset_good_objects(self):
+        '''
+        Forgets the good objects and pairs of the last event (or cut
+        configuration).
+        '''
+        # set up containers for good objects
+        self.good_vertices  = []
+        self.good_muons     = []
+        self.good_electrons = []
+        self.good_jets      = []
+        self.good_bjets     = []
+
+        self.dimuon_pairs     = []
+        self.dielectron_pairs = []
+        self.dijet_pairs      = []
+        # the jet pairs as tools.pairs.CandidatePairs, set with
+        #     dijet_pairs (if numpy is available)
+        self.dijet_arrays     = None
+
+
+    ## _________________________________________________________________________
+    def log_progress(self, nbefore):
+        '''
+        Logs progress every self.update_every events; nbefore is the number
+        of events processed before the current event (or batch).
+        '''
+        # the clock starts at the second event (the first one pays for
+        #     the set-up)
+        if nbefore < 2 <= self.eventsprocessed: self.starttime = time.time()
+        if (self.eventsprocessed // self.update_every
+            == nbefore // self.update_every): return
+        if self.eventsprocessed < 2*self.update_every:
+            logging.info('  Processing event '
+                '{0}/{1} ({2:0.0f}%) '.format(
+                    self.eventsprocessed,
+                    self.nevents_to_process,
+                    (100.*self.eventsprocessed)/self.nevents_to_process)
+            )
+            return
+        currenttime = time.time()
+        timeelapsed = currenttime - self.starttime
+        timeleft = ((float(self.nevents_to_process)
+            - float(self.eventsprocessed)) * (float(timeelapsed)
+            / float(self.eventsprocessed)))
+        minutesleft, secondsleft = divmod(int(timeleft), 60)
+        hoursleft, minutesleft = divmod(minutesleft, 60)
+        logging.info('  Processing event '
+            '{0}/{1} ({2:0.0f}%) [{3}:{4:02d}:{5:02d}]'.format(
+                self.eventsprocessed,
+                self.nevents_to_process,
+                (100.*self.eventsprocessed)/self.nevents_to_process,
+                hoursleft,
+                minutesleft,
+                secondsleft)
+        )
+
+
+    ## _________________________________________________________________________
+    def open_tree(self, prefetcher, n, fname, first, last):
+        '''
+        Opens input file fname (entry range n of the job) for the event loop
+        and returns (tfile, tree, row), row being what the loop reads from.
+        '''
+        # open the file (it may already be open if it was prefetched)
+        #     and start on the next one in the background
+        tfile = prefetcher.open(fname)
+        if n+1 < len(self.entry_ranges):
+            prefetcher.request(self.entry_ranges[n+1][1])
+        # get the AC1B tree
+        tree = tfile.Get('{0}/{1}'.format(self.treedir, self.treename))
+        # in record mode rows are read through a BranchRecorder;
+        #     in prune mode unused branches are switched off
+        row = self.branch_usage.bind(tree) if self.branch_usage else tree
+        # read baskets of the active branches in large blocks
+        cachesize = configure_tree_cache(tree, self.read_cache_mb)
+        if cachesize:
+            tree.SetCacheEntryRange(first, last)
+            logging.info('    Tree cache: {0:0.1f} MB'.format(
+                cachesize/1024./1024.))
+        return tfile, tree, row
+
+
+    ## _________________________________________________________________________
+    def load_collection(self, name):
+        '''
+        Returns collection name (see COLLECTION_COUNTS) of the current event.
+        The objects come from the pools, pointed at this event's candidates.
+        '''
+        if name not in self.available_collections:
+            return [] if name == 'met' else self.pools[name].collection()
+        row = self.row
+        # MET is a vector of size 1
+        if name == 'met': return self.pools['met'].get(row, 1)[0]
+        objects = self.pools[name].get(row,
+            getattr(row, COLLECTION_COUNTS[name]))
+        if name == 'muons' and self.use_rochester_corrections:
+            objects = objects.ordered_by('rochesterPt')
+        return objects
+
+
+    ## _________________________________________________________________________
+    def check_tagger_names(self, row):
+        '''
+        Resolves the b-tag working points (self.btag_names and
+        cuts['cBJetAlg'] of each cut configuration) and tau discriminators (self.tau_discriminator_names)
+        in the current file, so an unknown name raises its ValueError (with
+        the available names) before the event loop instead of in it.
+        '''
+        btags = list(self.btag_names)
+        for config in self.configurations:
+            if 'cBJetAlg' in config.attributes['cuts']:
+                btags += [config.attributes['cuts']['cBJetAlg']]
+        if btags and 'jets' in self.available_collections:
+            taggers = branch_table(row, 'ak4pfchsjet').tagger('btag_pass')
+            for name in btags: taggers[name]
+        discs = self.tau_discriminator_names
+        if discs and 'taus' in self.available_collections:
+            taggers = branch_table(row, 'tau').tagger('tdisc_')
+            for name in discs: taggers[name]
+
+
+    ## _________________________________________________________________________
+    def log_pool_stats(self):
+        '''
+        Logs how many Dataform objects per event the collections needed
+        (what used to be allocated every event) and how many the pools
+        actually allocated.
+        '''
+        nevents = max(1, self.eventsprocessed)
+        logging.info('Dataform objects per event (needed / allocated):')
+        for name, pool in self.pools.iteritems():
+            logging.info('    {0:10s}: {1:8.2f} / {2:8.4f}'.format(name,
+                float(pool.requested)/nevents, float(pool.allocated)/nevents))
+        logging.info('    {0:10s}: {1:8.2f} / {2:8.4f}'.format('total',
+            float(sum(p.requested for p in self.pools.itervalues()))/nevents,
+            float(sum(p.allocated for p in self.pools.itervalues()))/nevents))
+
+
+    ## _________________________________________________________________________
+    def log_memo_stats(self):
+        '''
+        Logs how many calls per event the memo of derived quantities saved
+        (see Dataform.memoized).
+        '''
+        if not memo_settings.enabled:
+            logging.info('Memo of derived quantities was switched off '
+                '(--no-memo)')
+            return
+        nevents = max(1, self.eventsprocessed)
+        logging.info('Memo of derived quantities: {0:0.2f} hits and {1:0.2f} '
+            'misses per event'.format(float(memo_settings.hits)/nevents,
+                float(memo_settings.misses)/nevents))
+
+
+    ## _________________________________________________________________________
+    def find_entry_ranges(self):
+        '''
+        Returns a list of (file index, file name, first entry, last entry+1)
+        for the files with entries in the requested global entry range
+        [first_entry, last_entry] (both inclusive, -1 meaning no limit),
+        and in the file chosen with --whichfile, if any. Entry ranges given
+        per file in the input list are applied on top.
+        '''
+        first = self.first_entry if self.first_entry != -1 else 0
+        last = (self.last_entry + 1 if self.last_entry != -1
+            else sum(info['nentries'] for info in self.file_metadata))
+
+        ranges = []
+        offset = 0
+        for f, (fname, info, limits) in enumerate(zip(self.filenames,
+            self.file_metadata, self.file_entry_limits)):
+            nentries = info['nentries']
+            lo = max(first - offset, 0)
+            hi = min(last - offset, nentries)
+            offset += nentries
+            if limits[0] != -1: lo = max(lo, limits[0])
+            if limits[1] != -1: hi = min(hi, limits[1] + 1)
+            if self.whichfile != -1 and f+1 != self.whichfile: continue
+            if lo >= hi: continue
+            ranges += [(f, fname, lo, hi)]
+        return ranges
+
+
     ## _________________________________________________________________________
     def per_event_action(self):
         '''
@@ -400,6 +840,19 @@ class AnalysisBase(object):
         pass
 
 
+    ## _________________________________________________________________________
+    def per_batch_action(self, batch):
+        '''
+        Function for action taken every batch of events (EventBatch) with
+        --batch-size, once per cut configuration. Can be overriden; by
+        default the events of the batch that passed event selection and
+        preselection go through per_event_action (once the batches of all
+        configurations are done, see process_batch_events), so analyses
+        written per event run unchanged.
+        '''
+        self.deferred_batches += [(self.configuration, batch)]
+
+
     ## _________________________________________________________________________
     def fill_efficiencies(self):
         '''
@@ -411,6 +864,10 @@ class AnalysisBase(object):
             self.cutflow.num_bins())
         self.histograms['hEfficiencies'].GetXaxis().SetTitle('')
         self.histograms['hEfficiencies'].GetYaxis().SetTitle('Events')
+        # one per cut configuration: keep it out of the current directory,
+        #     so the next one doesn't replace it there
+        if self.config_names:
+            self.histograms['hEfficiencies'].SetDirectory(0)
         # fill histogram
         for i, name in enumerate(self.cutflow.get_names()):
             # 0 is the underflow bin in root: first bin to fill is bin 1
@@ -456,7 +913,31 @@ class AnalysisBase(object):
 
         self.summary_tree.Write()
 
+        if self.config_names:
+            # a directory per cut configuration
+            for config in self.configurations:
+                self.use_configuration(config)
+                self.write_outputs(self.outfile.mkdir(config.name))
+                self.outfile.cd()
+        else:
+            self.write_outputs(self.outfile)
+
+        # finish up
+        logging.info('')
+        logging.info('Created the following file:')
+        logging.info('    {0}'.format(self.output))
+        self.outfile.Close()
+
+    ## _________________________________________________________________________
+    def write_outputs(self, directory):
+        '''
+        Writes the category trees and histograms (of the current cut
+        configuration) to directory.
+        '''
+        directory.cd()
         for tree in self.category_trees:
+            # trees are written to their own directory
+            if tree.GetDirectory() != directory: tree.SetDirectory(directory)
             tree.Write()
 
         #for hist in self.histograms:
@@ -465,7 +946,7 @@ class AnalysisBase(object):
 
         # make a directory and go into it
         for dirname in self.extra_histogram_map.keys():
-            tdir = self.outfile.mkdir(dirname)
+            tdir = directory.mkdir(dirname)
             tdir.cd()
             # write the histograms
             # self.extra_histogram_map is a map of string:histogram map
@@ -476,25 +957,26 @@ class AnalysisBase(object):
             #    if (self.extra_histogram_map[dirname][hist].GetEntries()
             #        or dirname=='categories'):
                 self.extra_histogram_map[dirname][hist].Write()
-            tdir.cd('../')
-
-        # finish up
-	logging.info('')
-	logging.info('Created the following file:')
-        logging.info('    {0}'.format(self.output))
-        self.outfile.Close()
+            directory.cd()
 
     ## _________________________________________________________________________
     def end_job(self):
         '''
         Finishes job:
-            fill_efficiencies
-            end_of_job_action
+            fill_efficiencies and end_of_job_action (for each cut
+                configuration)
             write
         '''
-        self.fill_efficiencies()
-        self.end_of_job_action()
+        # (the current attributes if the loop never started)
+        for config in self.configurations or make_configurations(self, []):
+            self.use_configuration(config)
+            if self.config_names:
+                logging.info('')
+                logging.info('Cut configuration {0}:'.format(config.name))
+            self.fill_efficiencies()
+            self.end_of_job_action()
         self.write()
+        if self.branch_usage: self.branch_usage.save()
         logging.info('')
         logging.info('Job complete.')
         logging.info(
@@ -510,6 +992,10 @@ class AnalysisBase(object):
             logging.info('    NOM XSEC : '
                 '{0} pb'.format(self.nom_xsec if self.nom_xsec != -1. else '--'))
         logging.info('    NEVENTS (skim) : {0}'.format(self.nevents_to_process))
+        if self.processes_slice:
+            logging.info('    ENTRIES (slice): {0}'.format(', '.join(
+                'file {0} [{1}, {2})'.format(f+1, first, last)
+                for f, fname, first, last in self.entry_ranges)))
         logging.info('    NEVENTS (orig) : {0}'.format(self.nevents))
         logging.info('    SUMWEIGHTS     : {0}'.format(self.sumweights))
 
@@ -553,6 +1039,24 @@ class AnalysisBase(object):
             trigger_factor, lepton_factor)
 
 
+    ## _________________________________________________________________________
+    def calculate_batch_weights(self, batch):
+        '''
+        Returns an array with the base event weight times the pileup factor
+        of each event of batch, as in calculate_event_weight. The trigger
+        and lepton factors need the good muons of the event, so they only
+        come from calculate_event_weight.
+        '''
+        if self.isdata: return numpy.ones(batch.size)
+        arrays = batch.arrays
+        weights = numpy.where(numpy.asarray(arrays.genweight,
+            dtype='float64') > 0., 1., -1.)
+        if self.do_pileup_reweighting:
+            weights *= self.puweights.get_weights(
+                arrays.numtruepileupinteractions)
+        return weights
+
+
     ## _________________________________________________________________________
     def print_event_info(self, this_cat):
         '''
@@ -705,11 +1209,66 @@ def parse_command_line(argv):
         help=('Max number of events to process (should be only used for '
             'debugging; results in incorrect sumweights)'))
     parser.add_argument('-s', '--skipevents', type=int, default=-1,
-        help=('Number of events to skip before processing (should be only used '
-            'for debugging; results in incorrect sumweights)'))
+        help=('Number of events to skip before processing, same as '
+            '--first-entry (should be only used for debugging; results in '
+            'incorrect sumweights)'))
+    parser.add_argument('--first-entry', type=int, default=-1,
+        help=('First entry to process, counted over the whole input file '
+            'list (results in incorrect sumweights)'))
+    parser.add_argument('--last-entry', type=int, default=-1,
+        help=('Last entry to process (inclusive), counted over the whole '
+            'input file list (results in incorrect sumweights)'))
     parser.add_argument('-f', '--whichfile', type=int, default=-1,
         help=('Number of input file (should be only used '
             'for debugging; results in incorrect sumweights)'))
+    parser.add_argument('--metadata-cache', type=str, default='',
+        help=('Per-file metadata cache to use (default: '
+            'AnalysisTool/data/metadata/metadata_cache.json)'))
+    parser.add_argument('--no-metadata-cache', action='store_true',
+        help='Read the info and lumi trees of every input file, without cache')
+    parser.add_argument('--scan-workers', type=int, default=4,
+        help=('Number of processes used to read the info and lumi trees '
+            'of input files that are not in the metadata cache'))
+    parser.add_argument('--read-cache-mb', type=float, default=0,
+        help=('Size of the read-ahead tree cache in MB (0: sized to the '
+            'branches being read; negative: no cache)'))
+    parser.add_argument('--prefetch', action='store_true',
+        help='Open the next input file in the background')
+    parser.add_argument('--warm-mb', type=float, default=0,
+        help=('With --prefetch, also read up to this many MB of the next '
+            'file\'s event tree into memory ahead of time'))
+    parser.add_argument('--file-cache-dir', type=str, default='',
+        help='Keep local copies of remote input files in this directory')
+    parser.add_argument('--file-cache-gb', type=float, default=20.,
+        help='Size limit of the file cache in GB (least recently used '
+            'files are deleted first)')
+    parser.add_argument('--file-cache-source', type=str, default='',
+        help=('Copy remote files into the cache from this local directory '
+            '(laid out like the storage element) instead of with xrdcp'))
+    parser.add_argument('--record-branches', type=str, default='',
+        help=('Write the names of all event tree branches the analysis reads '
+            'to this file'))
+    parser.add_argument('--prune-branches', type=str, default='',
+        help=('Only read the event tree branches listed in this file (as '
+            'written by --record-branches)'))
+    parser.add_argument('--no-memo', action='store_true',
+        help=('Recompute derived quantities (p4, pt, isolation, ...) on every '
+            'call instead of once per event (for debugging)'))
+    parser.add_argument('--columnar-cache', type=str, default='',
+        help=('Read the event tree from this columnar cache (made with '
+            'scripts/makeColumnarCache.py) instead of the input files'))
+    parser.add_argument('--batch-size', type=int, default=0,
+        help=('Run event selection and preselection on chunks of this many '
+            'entries at once, as numpy arrays, and call per_batch_action '
+            '(by default per_event_action on each event that passes)'))
+    parser.add_argument('--cut-configs', type=str, default='',
+        help=('Comma-separated names of cut configurations (from the '
+            'analysis\' cut_configurations) to evaluate in one pass, each '
+            'with its own cutflow and directory in the output file'))
+    parser.add_argument('--write-skim', type=str, default='',
+        help=('Also write the events that pass event selection and '
+            'preselection to this file, which can be used as input instead '
+            'of the full sample (best with --prune-branches)'))
 
     return parser.parse_args(argv)
 
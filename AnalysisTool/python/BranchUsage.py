@@ -0,0 +1,120 @@
+# AnalysisToolLight/AnalysisTool/python/BranchUsage.py
+'''
+Records which branches of the event tree an analysis actually reads, and
+uses such a record in later runs to switch all other branches off.
+
+Recording: every row.* lookup (and every Dataform _get, since Dataform
+objects read through the same row) goes through a BranchRecorder, which
+notes the branch name. The set is written to a text file at the end of
+the job, one branch per line.
+
+Pruning: the branch list is read back and every other branch is disabled
+with SetBranchStatus, so ROOT doesn't read or decompress it.
+NOTE: a disabled branch silently keeps its last value, so the branch list
+should be recorded on a run that exercises every code path (e.g. a few
+thousand events of MC, with the same options as the real job).
+'''
+import logging
+import os
+
+
+## _____________________________________________________________________________
+class BranchRecorder(object):
+    '''
+    Stands in for the event tree (as the row) and records which branches
+    are read.
+    '''
+    # constructors/helpers
+    def __init__(self, tree, used):
+        self._tree = tree
+        self._used = used
+        self._branchnames = set(b.GetName() for b in tree.GetListOfBranches())
+
+    def __getattr__(self, name):
+        if name in self._branchnames: self._used.add(name)
+        return getattr(self._tree, name)
+
+
+## _____________________________________________________________________________
+class BranchUsage(object):
+    '''
+    mode is either 'record' (write used branches to path at the end of the
+    job) or 'prune' (read used branches from path and disable the others).
+    '''
+    # constructors/helpers
+    def __init__(self, mode, path):
+        if mode not in ['record', 'prune']:
+            raise ValueError('BranchUsage: mode must be "record" or "prune", '
+                'not "{0}".'.format(mode))
+        self.mode = mode
+        self.path = path
+        self.used = set()
+
+        if self.mode == 'prune':
+            if not os.path.exists(self.path):
+                raise IOError('Branch list {0} not found.'.format(self.path))
+            self.used = set(read_branch_list(self.path))
+            logging.info('Read {0} used branches from {1}'.format(
+                len(self.used), self.path))
+
+    # methods
+    ## _________________________________________________________________________
+    def bind(self, tree):
+        '''
+        Call once per input file. Returns what the event loop should
+        use as the row instead of tree.
+        '''
+        if self.mode == 'record': return BranchRecorder(tree, self.used)
+        self.prune(tree)
+        return tree
+
+    ## _________________________________________________________________________
+    def prune(self, tree):
+        '''
+        Disables every branch of tree that isn't in the used set and logs
+        how many bytes per event that saves.
+        '''
+        branches = dict((b.GetName(), b) for b in tree.GetListOfBranches())
+        active = set(b for b in self.used if b in branches)
+        # variable size arrays also need their counter branch
+        for name in list(active):
+            leaf = branches[name].GetLeaf(name)
+            count = leaf.GetLeafCount() if leaf else None
+            if count: active.add(count.GetBranch().GetName())
+
+        tree.SetBranchStatus('*', 0)
+        for name in active:
+            tree.SetBranchStatus(name, 1)
+
+        nentries = max(1, tree.GetEntries())
+        zipbytes = dict((name, b.GetZipBytes()) for name, b in branches.iteritems())
+        total = sum(zipbytes.values())
+        saved = sum(n for name, n in zipbytes.iteritems() if name not in active)
+        logging.info('    Reading {0} of {1} branches: saves {2:0.2f} of '
+            '{3:0.2f} kB/event ({4:0.1f}%)'.format(len(active), len(branches),
+                saved/1024./nentries, total/1024./nentries,
+                (100.*saved)/total if total else 0.))
+        return active
+
+    ## _________________________________________________________________________
+    def save(self):
+        '''
+        In record mode, writes the used branches (merged with any that are
+        already in the file) to self.path.
+        '''
+        if self.mode != 'record': return
+        used = set(self.used)
+        if os.path.exists(self.path): used |= set(read_branch_list(self.path))
+        with open(self.path, 'w') as f:
+            for name in sorted(used):
+                f.write(name + '\n')
+        logging.info('')
+        logging.info('Wrote {0} used branches to {1}'.format(len(used),
+            self.path))
+
+
+## _____________________________________________________________________________
+def read_branch_list(path):
+    with open(path, 'r') as f:
+        return [line.strip() for line in f
+            if line.strip() and not line.startswith('#')]
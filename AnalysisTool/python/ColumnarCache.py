@@ -0,0 +1,295 @@
+# AnalysisToolLight/AnalysisTool/python/ColumnarCache.py
+'''
+Columnar cache of the event tree: the branches an analysis reads, stored as
+flat numpy arrays (.npy) that are memory-mapped when read back.
+
+AC1B collections are a counter branch (muon_count) plus one array branch per
+field (muon_pt[muon_count], ...). In the cache each field is one flat
+content array with the values of all entries, and each counter has an
+offsets array, so the values of entry i are content[offsets[i]:offsets[i+1]].
+Scalar branches are plain arrays with one value per entry.
+
+Each input file gets its own directory in the cache (see columnar_dir),
+holding the arrays and a columns.json manifest with the size and mtime of
+the source file, so stale copies are noticed.
+    convert_file: writes the cache directory for one input file
+        (scripts/makeColumnarCache.py does this for an input list)
+    ColumnarRow: stands in for the event tree (as the row) in AnalysisBase,
+        reading from the cache instead (--columnar-cache)
+    ColumnarBatch: a range of entries as whole arrays, e.g. for
+        Selection.run_batch
+NOTE: values are read through TTree::Draw (as doubles) and stored in the
+type of the leaf, so 64 bit integers are only exact up to 2^53.
+'''
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+from ROOT import TFile
+from MetadataCache import file_signature
+from tools.tree_arrays import read_branch_arrays, LEAF_DTYPES
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+COLUMNAR_VERSION = 1
+
+
+## _____________________________________________________________________________
+def columnar_dir(cachedir, fname):
+    return os.path.join(cachedir, hashlib.sha1(fname).hexdigest())
+
+
+## _____________________________________________________________________________
+def read_manifest(cachedir, fname):
+    '''
+    Returns the manifest of the cached copy of fname, or None if there is
+    none or it was made from a different version of the file.
+    '''
+    path = os.path.join(columnar_dir(cachedir, fname), 'columns.json')
+    if not os.path.exists(path): return None
+    with open(path, 'r') as f:
+        contents = json.load(f)
+    signature = file_signature(fname)
+    if contents['version'] != COLUMNAR_VERSION: return None
+    if signature is not None and contents['signature'] != list(signature):
+        return None
+    return contents
+
+
+## _____________________________________________________________________________
+def describe_branches(tree, branches):
+    '''
+    Returns {branch : (dtype, counter, length)} for the branches of tree that
+    can be stored: counter is the name of the count branch of variable size
+    arrays (None otherwise) and length the size of fixed size arrays (1 for
+    scalars). Count branches of the requested arrays are added. Branches that
+    can't be stored are logged and left out.
+    '''
+    columns = {}
+    skipped = []
+    todo = list(branches)
+    while todo:
+        name = todo.pop()
+        if name in columns: continue
+        branch = tree.GetBranch(name)
+        leaves = branch.GetListOfLeaves() if branch else None
+        if not leaves or leaves.GetEntries() != 1:
+            skipped += [name]
+            continue
+        leaf = leaves.At(0)
+        dtype = LEAF_DTYPES.get(leaf.GetTypeName())
+        if dtype is None:
+            skipped += [name]
+            continue
+        count = leaf.GetLeafCount()
+        counter = count.GetBranch().GetName() if count else None
+        if counter: todo += [counter]
+        columns[name] = (dtype, counter, 1 if counter else leaf.GetLenStatic())
+
+    if skipped:
+        logging.info('    Not storing {0} branches of unsupported type: '
+            '{1}'.format(len(skipped), ', '.join(sorted(skipped))))
+    return columns
+
+
+## _____________________________________________________________________________
+def convert_file(fname, treepath, branches, cachedir):
+    '''
+    Writes the columnar cache directory of input file fname, with the given
+    branches of its event tree (treepath). Returns the directory.
+    '''
+    if numpy is None:
+        raise ImportError('convert_file needs numpy')
+
+    signature = file_signature(fname)
+    tfile = TFile.Open(fname)
+    if not tfile or tfile.IsZombie():
+        raise IOError('Could not open file {0}'.format(fname))
+    tree = tfile.Get(treepath)
+    if not tree:
+        tfile.Close()
+        raise IOError('No {0} tree in {1}'.format(treepath, fname))
+    nentries = tree.GetEntries()
+    columns = describe_branches(tree, branches)
+
+    # write into a temporary directory and move it into place at the end
+    outdir = columnar_dir(cachedir, fname)
+    tmpdir = '{0}.{1}.tmp'.format(outdir, os.getpid())
+    if os.path.exists(tmpdir): shutil.rmtree(tmpdir)
+    os.makedirs(tmpdir)
+
+    # scalars first: the counters are needed for the offsets of the arrays.
+    #     branches of different collections can't be drawn together, so
+    #     they are read one collection at a time. Draw gives length rows
+    #     per entry for fixed size arrays, so those go with arrays of the
+    #     same length only
+    groups = {}
+    for name, (dtype, counter, length) in columns.iteritems():
+        groups.setdefault((counter, length), []).append(name)
+    offsets = {}
+    for key in sorted(groups, key=lambda k: (k[0] is not None, k[1])):
+        counter = key[0]
+        names = sorted(groups[key])
+        arrays = read_branch_arrays(tree, names)
+        if counter is not None:
+            counts = numpy.load(os.path.join(tmpdir, counter + '.npy'))
+            offsets[counter] = numpy.zeros(nentries+1, dtype='int64')
+            offsets[counter][1:] = numpy.cumsum(counts, dtype='int64')
+            numpy.save(os.path.join(tmpdir, counter + '.offsets.npy'),
+                offsets[counter])
+        for name in names:
+            dtype, length = columns[name][0], columns[name][2]
+            expected = offsets[counter][-1] if counter else nentries*length
+            if len(arrays[name]) != expected:
+                raise ValueError('convert_file: read {0} values of {1}, '
+                    'expected {2}'.format(len(arrays[name]), name, expected))
+            values = arrays[name].astype(dtype)
+            if length > 1: values = values.reshape(nentries, length)
+            numpy.save(os.path.join(tmpdir, name + '.npy'), values)
+
+    with open(os.path.join(tmpdir, 'columns.json'), 'w') as f:
+        json.dump({
+            'version'   : COLUMNAR_VERSION,
+            'source'    : fname,
+            'signature' : signature,
+            'nentries'  : nentries,
+            'columns'   : dict((name, {'dtype' : dtype, 'counter' : counter})
+                for name, (dtype, counter, length) in columns.iteritems()),
+        }, f)
+    tfile.Close()
+
+    if os.path.exists(outdir): shutil.rmtree(outdir)
+    os.rename(tmpdir, outdir)
+    return outdir
+
+
+## _____________________________________________________________________________
+class ColumnarReader(object):
+    '''
+    The cached arrays of one input file. Arrays are memory-mapped the first
+    time they are used, so only the pages that are read get loaded.
+    '''
+    # constructors/helpers
+    def __init__(self, cachedir, fname):
+        if numpy is None:
+            raise ImportError('ColumnarReader needs numpy')
+        self.path = columnar_dir(cachedir, fname)
+        contents = read_manifest(cachedir, fname)
+        if contents is None:
+            raise IOError('{0} is missing or out of date in the columnar '
+                'cache {1} (see scripts/makeColumnarCache.py)'.format(fname,
+                    cachedir))
+        self.nentries = contents['nentries']
+        self.columns = contents['columns']
+        self.arrays = {}
+
+    def _load(self, name):
+        if name not in self.arrays:
+            self.arrays[name] = numpy.load(os.path.join(self.path, name),
+                mmap_mode='r')
+        return self.arrays[name]
+
+    # methods
+    ## _________________________________________________________________________
+    def value(self, name, entry):
+        '''
+        Returns the value of branch name in entry as PyROOT would: a number
+        for scalars, a list for arrays.
+        '''
+        column = self.columns.get(name)
+        if column is None:
+            raise AttributeError('{0} is not in the columnar cache'.format(name))
+        content = self._load(name + '.npy')
+        if column['counter'] is None: return content[entry].tolist()
+        offsets = self._load(column['counter'] + '.offsets.npy')
+        return content[offsets[entry]:offsets[entry+1]].tolist()
+
+
+## _____________________________________________________________________________
+class ColumnarRow(object):
+    '''
+    Stands in for the event tree, reading the values of the current entry
+    from a ColumnarReader. Like the tree, it's moved to an entry with
+    GetEntry; each value is looked up once per entry and then kept as an
+    attribute until the next GetEntry.
+    '''
+    # constructors/helpers
+    def __init__(self, reader):
+        self._reader = reader
+        self._entry = 0
+        self._loaded = []
+
+    def __getattr__(self, name):
+        if name.startswith('_'): raise AttributeError(name)
+        value = self._reader.value(name, self._entry)
+        self.__dict__[name] = value
+        self._loaded.append(name)
+        return value
+
+    # methods
+    ## _________________________________________________________________________
+    def GetEntry(self, entry):
+        for name in self._loaded:
+            del self.__dict__[name]
+        self._loaded = []
+        self._entry = entry
+
+    ## _________________________________________________________________________
+    def GetEntries(self):
+        return self._reader.nentries
+
+    ## _________________________________________________________________________
+    def branch_names(self):
+        ''' The branches in the cache (the tree has GetListOfBranches) '''
+        return sorted(self._reader.columns)
+
+
+## _____________________________________________________________________________
+class ColumnarBatch(object):
+    '''
+    Entries [first, last) of a ColumnarReader as whole arrays: like the
+    tree, it has an attribute per branch, with one value per entry for
+    scalar branches and the values of all candidates of the entries, one
+    after the other, for collection branches. offsets(counter) gives where
+    the candidates of each entry start and end in those. The arrays are
+    slices of the memory-mapped cache, read when they are first used.
+    '''
+    # constructors/helpers
+    def __init__(self, reader, first, last):
+        self._reader = reader
+        self._first = first
+        self._last = last
+        self._offsets = {}
+        self.size = last - first
+
+    def __getattr__(self, name):
+        if name.startswith('_'): raise AttributeError(name)
+        column = self._reader.columns.get(name)
+        if column is None:
+            raise AttributeError('{0} is not in the columnar cache'.format(name))
+        content = self._reader._load(name + '.npy')
+        if column['counter'] is None:
+            value = content[self._first:self._last]
+        else:
+            start = self._reader._load(column['counter']
+                + '.offsets.npy')[self._first]
+            value = content[start:start + self.offsets(column['counter'])[-1]]
+        self.__dict__[name] = value
+        return value
+
+    # methods
+    ## _________________________________________________________________________
+    def offsets(self, counter):
+        if counter not in self._offsets:
+            if counter not in self._reader.columns:
+                raise AttributeError('{0} is not in the columnar '
+                    'cache'.format(counter))
+            offsets = self._reader._load(counter + '.offsets.npy')[
+                self._first:self._last+1]
+            self._offsets[counter] = offsets - offsets[0]
+        return self._offsets[counter]
@@ -0,0 +1,97 @@
+# AnalysisToolLight/AnalysisTool/python/CutConfigurations.py
+'''
+Several cut configurations (e.g. working points) evaluated in one pass over
+the data. The analysis names its configurations in self.cut_configurations
+(name : cuts dictionary) and --cut-configs picks the ones to run.
+
+Each CutConfiguration has its own copy of the attributes listed in
+analysis.config_attributes: by default the cuts, the selection compiled
+from them, the cutflow, the histograms and the category trees; derived
+analyses add their own histogram maps and counters. AnalysisBase switches
+between them (use_configuration) within each event, so all configurations
+share the decoded inputs (the collections, and the Dataform objects with
+their memos), and writes the outputs of each configuration to its own
+directory of the output file.
+'''
+from ROOT import TH1, TTree
+from CutFlow import CutFlow
+from Selection import compile_selection
+
+
+## _____________________________________________________________________________
+class CutConfiguration(object):
+    '''
+    The name and the attributes of one configuration
+    '''
+    __slots__ = ('name', 'attributes')
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+
+
+## _____________________________________________________________________________
+def clone_outputs(value, memo):
+    '''
+    Copy of value for another configuration: dicts and lists are copied,
+    histograms are cloned and trees are cloned empty (their branches still
+    read the same buffers). Anything else (numbers, strings, ...) is kept.
+    Objects seen before (memo, by id) are copied once, so e.g. a histogram
+    map that is also in extra_histogram_map stays the same object.
+    '''
+    if id(value) in memo: return memo[id(value)]
+    if isinstance(value, dict):
+        copy = memo[id(value)] = value.__class__()
+        for key, item in value.iteritems():
+            copy[key] = clone_outputs(item, memo)
+    elif isinstance(value, list):
+        copy = memo[id(value)] = []
+        copy += [clone_outputs(item, memo) for item in value]
+    elif isinstance(value, TTree):
+        copy = memo[id(value)] = value.CloneTree(0)
+    elif isinstance(value, TH1):
+        copy = memo[id(value)] = value.Clone()
+        copy.SetDirectory(0)
+    else:
+        copy = value
+    return copy
+
+
+## _____________________________________________________________________________
+def make_configurations(analysis, names):
+    '''
+    Returns a CutConfiguration for each of names (keys of
+    analysis.cut_configurations), or, without names, one with the current
+    attributes of analysis.
+    '''
+    current = dict((attr, getattr(analysis, attr))
+        for attr in analysis.config_attributes)
+    if not names: return [CutConfiguration('', current)]
+
+    available = getattr(analysis, 'cut_configurations', {})
+    for name in names:
+        if name not in available:
+            raise ValueError('"{0}" is not an available cut configuration. '
+                'Available configurations are {1}.'.format(name,
+                    ', '.join('"{0}"'.format(c) for c in available) or
+                        'none'))
+
+    configurations = []
+    for name in names:
+        memo = {}
+        attributes = dict((attr, clone_outputs(value, memo))
+            for attr, value in current.iteritems()
+            if attr not in ('cuts', 'selection', 'cutflow'))
+        attributes['cuts'] = available[name]
+        attributes['selection'] = compile_selection(available[name])
+        # the counters of the current cutflow, with the labels of this
+        #     configuration's selection
+        cutflow = CutFlow()
+        for counter in analysis.cutflow.get_names():
+            cutflow.add_static(counter, analysis.cutflow.get_pretty(counter),
+                analysis.cutflow.count(counter))
+        labels = CutFlow()
+        attributes['selection'].register(labels)
+        cutflow.pretty.update(labels.pretty)
+        attributes['cutflow'] = cutflow
+        configurations += [CutConfiguration(name, attributes)]
+    return configurations
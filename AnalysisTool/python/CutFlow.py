@@ -17,8 +17,8 @@ class CutFlow(object):
     def add_static(self, var, label, num):
         self.counters[var] = num
         self.pretty[var] = label
-    def increment(self, arg): # increases counter "arg" by 1
-        self.counters[arg] += 1.
+    def increment(self, arg, num=1.): # increases counter "arg" by num
+        self.counters[arg] += num
     def num_bins(self): # returns number of counters
         return len(self.counters)
     def count(self, name): # returns the current value of the counter "name"
@@ -4,8 +4,243 @@ See RootMaker/RootMaker/python/objectBase.py
 '''
 
 from ROOT import TVector3, TLorentzVector
+import bisect
+import logging
 import math
+import functools
+import itertools
 from collections import OrderedDict, namedtuple
+from tools.fourvector import FourVector
+from tools.tree_arrays import LEAF_DTYPES
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+## ___________________________________________________________
+class MemoSettings(object):
+    '''
+    Switch and counters of the per-event memo of derived quantities
+    (see memoized). Set memo_settings.enabled = False to recompute
+    everything on every call, e.g. when debugging.
+    '''
+    def __init__(self):
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+
+memo_settings = MemoSettings()
+
+## ___________________________________________________________
+def memoized(method):
+    '''
+    Keeps the result of method (per object and arguments) in the object's
+    memo, which is cleared when the object is pointed at a new event (see
+    CollectionPool). Only for methods whose result depends on nothing but
+    the current event; cached objects (e.g. p4s) must not be modified.
+    '''
+    name = method.__name__
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if kwargs or not memo_settings.enabled:
+            return method(self, *args, **kwargs)
+        key = (name,) + args if args else name
+        memo = self.memo
+        if key in memo:
+            memo_settings.hits += 1
+            return memo[key]
+        memo_settings.misses += 1
+        value = memo[key] = method(self, *args)
+        return value
+    return wrapper
+
+
+## ___________________________________________________________
+class LateBoundArray(object):
+    '''
+    Branch handle for rows whose values are new objects every entry (e.g.
+    ColumnarRow): looks the branch up again on every access.
+    '''
+    def __init__(self, tree, name):
+        self.tree = tree
+        self.name = name
+    def __getitem__(self, i): return getattr(self.tree, self.name)[i]
+
+## ___________________________________________________________
+def stable_buffer(tree, name, value):
+    '''
+    PyROOT returns array branches as buffers over the leaf's memory, which
+    stays put from entry to entry, but sizes them to the current entry.
+    Returns the buffer resized to the largest size in the file, or None if
+    value can't be used like that.
+    '''
+    if not hasattr(value, 'SetSize'): return None
+    leaf = tree.GetLeaf(name)
+    if not leaf: return None
+    count = leaf.GetLeafCount()
+    size = leaf.GetLenStatic() * (count.GetMaximum() if count else 1)
+    if size < 1: return None
+    value.SetSize(size)
+    return value
+
+## ___________________________________________________________
+class BranchTable(dict):
+    '''
+    Accessor table of one collection (branch prefix) in one tree: maps
+    variable name -> branch handle, so that
+        table[var][i] == getattr(tree, prefix+'_'+var)[i]
+    Handles are resolved the first time a variable is used and then shared
+    by all objects of the collection until the tree changes.
+    '''
+    def __init__(self, tree, prefix):
+        super(BranchTable, self).__init__()
+        self.tree = tree
+        self.prefix = prefix
+        # numpy type of the buffer of each variable (None: not a buffer)
+        self.dtypes = {}
+        # resolved HLT paths of each list of paths (see hlt_matches)
+        self.triggers = {}
+        # TaggerTable of each kind of tagger (see tagger)
+        self.taggers = {}
+    def __missing__(self, var):
+        name = '{0}_{1}'.format(self.prefix, var)
+        # missing branches raise AttributeError here, like getattr on the tree
+        value = getattr(self.tree, name)
+        handle = stable_buffer(self.tree, name, value)
+        if handle is None: handle = LateBoundArray(self.tree, name)
+        self[var] = handle
+        return handle
+
+    def array(self, var, n):
+        '''
+        Returns the values of var for candidates 0 ... n-1 of the current
+        entry as a numpy array: a view of the branch buffer, so no copy,
+        when there is one (and a copy otherwise).
+        '''
+        handle = self[var]
+        if var not in self.dtypes:
+            self.dtypes[var] = _buffer_dtype(self.tree,
+                '{0}_{1}'.format(self.prefix, var), handle)
+        dtype = self.dtypes[var]
+        if dtype is None:
+            return numpy.array([handle[i] for i in xrange(n)])
+        if n == 0: return numpy.zeros(0, dtype=dtype)
+        return numpy.frombuffer(handle, dtype=dtype, count=n)
+
+    def hlt_matches(self, paths):
+        '''
+        Returns [(bit, var)] for the trigger-match variables 'matches_'+path
+        of the paths that are in the tree (see resolve_paths)
+        '''
+        key = tuple(paths)
+        if key not in self.triggers:
+            prefix = '{0}_matches_'.format(self.prefix)
+            self.triggers[key] = [(bit, name[len(self.prefix)+1:])
+                for bit, name in resolve_paths(self.tree, prefix, key)]
+        return self.triggers[key]
+
+    def tagger(self, kind):
+        '''
+        Returns the TaggerTable of kind ('btag_pass', 'tdisc_') of this
+        collection: tagger(kind)[name] is the handle of variable kind+name
+        '''
+        table = self.taggers.get(kind)
+        if table is None: table = self.taggers[kind] = TaggerTable(self, kind)
+        return table
+
+# what each kind of tagger is called in error messages
+TAGGER_KINDS = {
+    'btag_pass' : 'Btag',
+    'tdisc_'    : 'Tau discriminator',
+}
+
+## ___________________________________________________________
+class TaggerTable(dict):
+    '''
+    Handles of the b-tag working points or tau discriminators of one
+    collection in one file, by name:
+        table['CSVv2M'][i] == getattr(tree, 'ak4pfchsjet_btag_passCSVv2M')[i]
+    An unknown name raises a ValueError listing the available ones.
+    '''
+    def __init__(self, branches, kind):
+        super(TaggerTable, self).__init__()
+        self.branches = branches
+        self.kind = kind
+    def __missing__(self, name):
+        try:
+            handle = self.branches[self.kind + name]
+        except AttributeError:
+            prefix = '{0}_{1}'.format(self.branches.prefix, self.kind)
+            raise ValueError('{0} "{1}" not available. Available names are: '
+                '{2}'.format(TAGGER_KINDS.get(self.kind, self.kind), name,
+                    ', '.join(available_names(self.branches.tree, prefix))))
+        self[name] = handle
+        return handle
+
+## ___________________________________________________________
+def available_names(tree, prefix):
+    ''' Names of the branches prefix+name of tree, without the prefix '''
+    if hasattr(tree, 'GetListOfBranches'):
+        names = [x.GetName() for x in tree.GetListOfBranches()]
+    else:
+        names = tree.branch_names()
+    return sorted(name[len(prefix):] for name in names
+        if name.startswith(prefix))
+
+## ___________________________________________________________
+def _buffer_dtype(tree, name, handle):
+    # numpy type to view handle with, or None if it can't be viewed
+    if isinstance(handle, LateBoundArray): return None
+    leaf = tree.GetLeaf(name)
+    dtype = LEAF_DTYPES.get(leaf.GetTypeName()) if leaf else None
+    if dtype is None: return None
+    try:
+        numpy.frombuffer(handle, dtype=dtype)
+    except (TypeError, ValueError):
+        return None
+    return dtype
+
+# paths that have been warned about (see resolve_paths)
+_missing_paths = set()
+
+## ___________________________________________________________
+def resolve_paths(tree, prefix, paths):
+    '''
+    Returns [(bit, name)] for the HLT paths that have a branch name =
+    prefix+path in tree, where bit = 1 << (index of path in paths), so the
+    decisions of all paths fit in one int. Each missing path is warned
+    about once (the first time it's missing).
+    '''
+    present = []
+    for i, path in enumerate(paths):
+        name = prefix + path
+        try:
+            getattr(tree, name)
+        except AttributeError:
+            if name not in _missing_paths:
+                _missing_paths.add(name)
+                logging.info('    WARNING: HLT path branch "{0}" not available '
+                    '(ignoring it where it\'s missing).'.format(name))
+            continue
+        present.append((1 << i, name))
+    return present
+
+# the current table of each collection. the table keeps its tree alive, so
+#     the identity check can't be fooled by a new tree at the same address
+_branch_tables = {}
+
+## ___________________________________________________________
+def branch_table(tree, prefix):
+    '''
+    Returns the accessor table of collection prefix in tree, making a new
+    one whenever the tree changes (i.e. once per input file).
+    '''
+    table = _branch_tables.get(prefix)
+    if table is None or table.tree is not tree:
+        table = _branch_tables[prefix] = BranchTable(tree, prefix)
+    return table
 
 
 ## ___________________________________________________________
@@ -13,10 +248,13 @@ class Event(object):
     '''
     Event object
     '''
+    __slots__ = ('tree', 'sumweights', 'triggers')
     # constructors/helpers
     def __init__(self, tree, sumweights):
         self.tree = tree
         self.sumweights = sumweights
+        # resolved HLT paths of each list of paths (see hlt_bits)
+        self.triggers = {}
     def _get(self, var): return getattr(self.tree, var)
 
     # methods
@@ -46,33 +284,38 @@ class Event(object):
     ## _______________________________________________________
     def print_available_tau_discriminators(self):
         print 'Available discriminators are:'
-        for x in self.tree.GetListOfBranches():
-            if 'tau_tdisc_' in x.GetName(): print '    ' + x.GetName()[10:]
+        for name in available_names(self.tree, 'tau_tdisc_'):
+            print '    ' + name
         print '\n'
 
     ## _______________________________________________________
     def print_available_btags(self):
         print 'Available btags are:'
-        for x in self.tree.GetListOfBranches():
-            if 'ak4pfchsjet_btag_' in x.GetName(): print '    ' + x.GetName()[17:]
+        # the names Jet.btag accepts (the same ones its error lists)
+        for name in available_names(self.tree, 'ak4pfchsjet_btag_pass'):
+            print '    ' + name
         print '\n'
 
     ## _______________________________________________________
     def passes_HLTs(self, paths):
-        ''' Returnsbool whether any of the triggers fired
+        ''' Returns bool whether any of the triggers fired
         '''
-        result = False
-        for pathname in paths:
-            try:
-                result = result or self._get('passes_'+pathname)
-            except AttributeError:
-                print 'PassesHLTs: Event HLT path "' + pathname + '" not available.'
-                #print 'Available paths are:'
-                #for x in self.tree.GetListOfBranches():
-                #    if 'event_hlt_passes_' in x.GetName():
-                #        print '    ' + x.GetName()[17:]
-                #print '\n'
-        return result
+        return self.hlt_bits(paths) != 0
+
+    def hlt_bits(self, paths):
+        ''' Returns the trigger decisions as a bitmask: bit i is set if
+            paths[i] fired. Paths missing in the file count as not fired.
+        '''
+        key = tuple(paths)
+        present = self.triggers.get(key)
+        if present is None:
+            present = self.triggers[key] = resolve_paths(self.tree, 'passes_',
+                key)
+        tree = self.tree
+        bits = 0
+        for bit, name in present:
+            if getattr(tree, name): bits |= bit
+        return bits
 
     ## _______________________________________________________
     def any_is_prescaled(self, paths):
@@ -113,13 +356,15 @@ class Vertex(object):
     '''
     Vertices from reco::Vertex objects
     '''
+    __slots__ = ('tree', 'candName', 'entry', 'branches', 'memo')
     # constructors/helpers
     def __init__(self, tree, entry):
         self.tree = tree
         self.candName = 'primvertex'
         self.entry = entry
-    def _get(self, var): 
-        return getattr(self.tree, '{0}_{1}'.format('primvertex', var))[self.entry]
+        self.branches = branch_table(tree, self.candName)
+        self.memo = {}
+    def _get(self, var): return self.branches[var][self.entry]
 
     # methods
     def x(self): return self._get('x')
@@ -142,13 +387,15 @@ class METBase(object):
     '''
     Basic objects from reco::PFMET objects
     '''
+    __slots__ = ('tree', 'metName', 'entry', 'branches', 'memo')
     # constructors/helpers
     def __init__(self, tree, metName, entry):
         self.tree = tree
         self.metName = metName
         self.entry = entry
-    def _get(self, var):
-        return getattr(self.tree, '{0}_{1}'.format(self.metName, var))[self.entry]
+        self.branches = branch_table(tree, metName)
+        self.memo = {}
+    def _get(self, var): return self.branches[var][self.entry]
 
     # methods
     def e(self):  return TVector3(self._get('ex'), self._get('ey'), 0.)
@@ -173,6 +420,7 @@ class METBase(object):
 
 ## ___________________________________________________________
 class PFMETTYPE1(METBase):
+    __slots__ = ()
     # constructors/helpers
     def __init__(self, tree, entry):
        super(PFMETTYPE1, self).__init__(tree, 'pfmettype1', entry)
@@ -187,13 +435,15 @@ class CandBase(object):
     Basic objects from reco::Candidate objects
     p4 = TLorentzVector(pt, eta, phi, mass)
     '''
+    __slots__ = ('tree', 'candName', 'entry', 'branches', 'memo')
     # constructors/helpers
     def __init__(self, tree, candName, entry):
         self.tree = tree
         self.candName = candName
         self.entry = entry
-    def _get(self, var):
-        return getattr(self.tree, '{0}_{1}'.format(self.candName, var))[self.entry]
+        self.branches = branch_table(tree, candName)
+        self.memo = {}
+    def _get(self, var): return self.branches[var][self.entry]
 
     # misc methods
     def rho(self): return self.tree.event_rho
@@ -204,13 +454,20 @@ class CandBase(object):
         return TVector3(self._get('px'), self._get('py'), self._get('pz'))
     def pt(self):      return self._get('pt')
     def eta(self):     return self._get('eta')
+    @memoized
     def abs_eta(self): return abs(self._get('eta'))
     def phi(self):     return self._get('phi')
     def energy(self):  return self._get('energy')
+    @memoized
     def p4(self):
         thisp4 = TLorentzVector()
         thisp4.SetPtEtaPhiM(self.pt(), self.eta(), self.phi(), self.mass())
         return thisp4
+    @memoized
+    def four_vector(self):
+        ''' Same as p4(), as a (pure python) tools.fourvector.FourVector '''
+        return FourVector.from_pt_eta_phi_m(self.pt(), self.eta(), self.phi(),
+            self.mass())
     def charge(self): return self._get('charge')
     def mass(self):   return self._get('mass')
     def pdg_id(self): return self._get('pdgid')
@@ -219,6 +476,7 @@ class CandBase(object):
 
 ## ___________________________________________________________
 class CommonCand(CandBase):
+    __slots__ = ()
     # constructors/helpers
     def __init__(self, tree, obtype, entry):
        super(CommonCand, self).__init__(tree, obtype, entry)
@@ -226,8 +484,26 @@ class CommonCand(CandBase):
     # methods
     #gen*
 
+    # cand.matches_HLTs returns True if it matches any of the triggers
+    def matches_HLTs(self, paths):
+        ''' Returns bool whether it's matched to any of the triggers
+        '''
+        return self.hlt_match_bits(paths) != 0
+
+    def hlt_match_bits(self, paths):
+        ''' Returns the trigger matches as a bitmask: bit i is set if it's
+            matched to paths[i]
+        '''
+        branches = self.branches
+        entry = self.entry
+        bits = 0
+        for bit, var in branches.hlt_matches(paths):
+            if branches[var][entry]: bits |= bit
+        return bits
+
 ## ___________________________________________________________
 class JettyCand(CandBase):
+    __slots__ = ()
     # constructors/helpers
     def __init__(self, tree, jttype, entry):
        super(JettyCand, self).__init__(tree, jttype, entry)
@@ -237,6 +513,7 @@ class JettyCand(CandBase):
 
 ## ___________________________________________________________
 class EgammaCand(CommonCand):
+    __slots__ = ()
     # constructors/helpers
     def __init__(self, tree, egtype, entry):
        super(EgammaCand, self).__init__(tree, egtype, entry)
@@ -278,6 +555,20 @@ class EgammaCand(CommonCand):
 
 
 
+# variable of each Muon POG ID (see Muon.check_id)
+MUON_IDS = OrderedDict([
+    ('tight',      'is_tight_muon'),
+    ('medium',     'is_medium_muon'),
+    ('medium2016', 'is_medium2016_muon'),
+    ('loose',      'is_loose_muon'),
+])
+# upper cut on iso_PFr4dB_comb_rel of each PF_dB isolation level (r = 0.4)
+#     (see Muon.check_iso)
+MUON_PF_DB_ISO = OrderedDict([
+    ('tight', 0.15),
+    ('loose', 0.25),
+])
+
 ## ___________________________________________________________
 class Muon(CommonCand):
     '''
@@ -288,6 +579,7 @@ class Muon(CommonCand):
     you can also explicitly call:
         mu.pt('corr') and mu.pt('uncorr')
     '''
+    __slots__ = ('corrected',)
     # constructors/helpers
     def __init__(self, tree, entry, corrected):
        super(Muon, self).__init__(tree, 'muon', entry)
@@ -299,6 +591,7 @@ class Muon(CommonCand):
     def dxy(self):       return self._get('dxy')
     def dxy_error(self): return self._get('dxyerr')
 
+    @memoized
     def pt(self, correction=''):
         uncor = self._get('pt')
         cor   = self._get('rochesterPt')
@@ -311,6 +604,7 @@ class Muon(CommonCand):
     def pt_roch(self):
         return self._get('rochesterPt')
 
+    @memoized
     def p4(self, correction=''): # pt, eta, phi, m
         corrp4 = TLorentzVector()
         corrp4.SetPtEtaPhiM(self.pt('corr'), self.eta(),
@@ -324,6 +618,12 @@ class Muon(CommonCand):
         elif self.corrected:         return corrp4
         else: return uncorrp4
 
+    @memoized
+    def four_vector(self, correction=''):
+        ''' Same as p4(correction), as a tools.fourvector.FourVector '''
+        return FourVector.from_pt_eta_phi_m(self.pt(correction), self.eta(),
+            self.phi(), self.mass())
+
     # energy
     def ecal_energy(self): return self._get('ecalenergy')
     def hcal_energy(self): return self._get('hcalenergy')
@@ -407,6 +707,7 @@ class Muon(CommonCand):
         return ((self._get('isolationr3track') + self._get('isolationr3ecal')
                 + self._get('isolationr3hcal')) / self.pt())
     # corrected relative isolation
+    @memoized
     def iso_PFr3dB_comb_rel(self): 
         isoval = (
             (self._get('pfisolationr3_sumchargedhadronpt')
@@ -417,6 +718,7 @@ class Muon(CommonCand):
             ) / self.pt()
         )
         return isoval
+    @memoized
     def iso_PFr4dB_comb_rel(self): 
         isoval = (
             (self._get('pfisolationr4_sumchargedhadronpt')
@@ -434,10 +736,7 @@ class Muon(CommonCand):
     def check_id(self, idtype):
         ''' Returns bool whether the muon passes Muon POG ID definitions
         '''
-        if idtype == 'tight':        return self.is_tight()
-        elif idtype == 'medium':     return self.is_medium()
-        elif idtype == 'medium2016': return self.is_medium2016()
-        elif idtype == 'loose':      return self.is_loose()
+        if idtype in MUON_IDS: return self._get(MUON_IDS[idtype])
         else:
             raise ValueError('Muon.check_id: "{0}" not an available choice for '
                              'idtype. Available choices are "tight", "medium", '
@@ -448,19 +747,14 @@ class Muon(CommonCand):
             values taken from:
             https://twiki.cern.ch/twiki/bin/view/CMS/SWGuideMuonIdRun2#Muon_Isolation
         '''
-         # r = 0.4
-        PF_dB_tight = 0.15
-        PF_dB_loose = 0.25
          # r = 0.3
         tracker_tight = 0.05
         tracker_loose = 0.10
 
         # check result
         if isotype == 'PF_dB':
-            if isolevel == 'tight':
-                return (self.iso_PFr4dB_comb_rel() < PF_dB_tight)
-            elif isolevel == 'loose':
-                return (self.iso_PFr4dB_comb_rel() < PF_dB_loose)
+            if isolevel in MUON_PF_DB_ISO:
+                return (self.iso_PFr4dB_comb_rel() < MUON_PF_DB_ISO[isolevel])
             else:
                 raise ValueError('Muon.check_iso: "{0}" not an available choice '
                                  'for isolevel. Available choices are "tight" '
@@ -480,28 +774,11 @@ class Muon(CommonCand):
 #                             '"tracker".'.format(isotype))
                              'that\'s it lol'.format(isotype))
 
-    # muon.MatchesHLTs returns True if any of the triggers fired
-    def matches_HLTs(self, paths):
-        ''' Returns bool whether any of the triggers fired
-        '''
-        result = False
-        for pathname in paths:
-            try:
-                result = result or self._get('matches_'+pathname)
-            except AttributeError:
-                pass
-                #print 'Muon HLT path "' + pathname + '" not available.'
-                #print 'Available paths are:'
-                #for x in self.tree.GetListOfBranches():
-                #    if 'muon_hlt_matches_' in x.GetName():
-                #        print '    ' + x.GetName()[17:]
-                #print '\n'
-        return result
-
 
 
 ## ___________________________________________________________
 class Electron(EgammaCand):
+    __slots__ = ()
     # constructors/helpers
     def __init__(self, tree, entry):
        super(Electron, self).__init__(tree, 'electron', entry)
@@ -535,24 +812,9 @@ class Electron(EgammaCand):
     def is_medium(self): return self._get('cutBasedMedium')
     def is_tight(self):  return self._get('cutBasedTight')
 
-    # electron.MatchesHLTs returns True if any of the triggers fired
-    def matches_HLTs(self, paths):
-        result = False
-        for pathname in paths:
-            try:
-                result = result or self._get('matches_'+pathname)
-            except AttributeError:
-                pass
-                #print 'Electron HLT path "{0}" not available.'.format(pathname)
-                #print 'Available paths are:'
-                #for x in self.tree.GetListOfBranches():
-                #    if 'electron_hlt_matches_' in x.GetName():
-                #        print '    ' + x.GetName()[21:]
-                #print '\n'
-        return result
-
 ## ___________________________________________________________
 class Photon(EgammaCand):
+    __slots__ = ()
     # constructors/helpers
     def __init__(self, tree, entry):
        super(Photon, self).__init__(tree, 'photon', entry)
@@ -573,6 +835,7 @@ class Photon(EgammaCand):
 
 ## ___________________________________________________________
 class Tau(JettyCand):
+    __slots__ = ()
     # constructors/helpers
     def __init__(self, tree, entry):
        super(Tau, self).__init__(tree, 'tau', entry)
@@ -598,46 +861,70 @@ class Tau(JettyCand):
     def PU_corr_pt_sum(self):            return self._get('puCorrPtSum')
 
     # tau ids
-    def tau_discriminator(self, discname): 
-        try:
-            return self._get('tdisc_'+discname)
-        except AttributeError:
-            print 'Tau discriminator "' + discname + '" not available.'
-            print ('Print a list of available discriminators with:'
-                   '\n    self.event.print_available_tau_discriminators()')
-            #raise
+    def tau_discriminator(self, discname):
+        return self.branches.tagger('tdisc_')[discname][self.entry]
+
 
+## ___________________________________________________________
+class JetShiftTable(object):
+    '''
+    Jet energy scale uncertainty vs. (pt, eta), copied out of a TH2 once so
+    that lookups don't go through PyROOT:
+        table.value(pt, eta) == h.GetBinContent(h.GetXaxis().FindBin(pt),
+                                                h.GetYaxis().FindBin(eta))
+    (including under- and overflow bins)
+    '''
+    __slots__ = ('xedges', 'yedges', 'contents')
+    def __init__(self, hist):
+        xaxis, yaxis = hist.GetXaxis(), hist.GetYaxis()
+        nx, ny = xaxis.GetNbins(), yaxis.GetNbins()
+        self.xedges = [xaxis.GetBinLowEdge(i) for i in xrange(1, nx+2)]
+        self.yedges = [yaxis.GetBinLowEdge(i) for i in xrange(1, ny+2)]
+        self.contents = [[hist.GetBinContent(ix, iy) for iy in xrange(ny+2)]
+            for ix in xrange(nx+2)]
+
+    def value(self, x, y):
+        # bisect_right gives the bin number FindBin would: the number of
+        #     low edges <= x, 0 for underflow and nbins+1 for overflow
+        return self.contents[bisect.bisect_right(self.xedges, x)][
+            bisect.bisect_right(self.yedges, y)]
 
 ## ___________________________________________________________
 class Jet(JettyCand):
+    '''
+    Jet: pt('Up') and pt('Down') are shifted by the jet energy scale
+    uncertainty tables (JetShiftTable) given to the constructor; the
+    nominal and both shifted pts are computed once per jet per event.
+    '''
+    __slots__ = ('shift', 'shift_down', 'shift_up')
     # constructors/helpers
-    def __init__(self, tree, entry, shift, h_down, h_up):
+    def __init__(self, tree, entry, shift, shift_down, shift_up):
        super(Jet, self).__init__(tree, 'ak4pfchsjet', entry)
+       self.shift = shift
+       self.shift_down = shift_down
+       self.shift_up = shift_up
 
 
     # methods
     def pt(self, shift=''):
+        pts = self.pts()
+        return pts[shift] if shift in pts else pts['']
+
+    @memoized
+    def pts(self):
+        ''' {'': nominal pt, 'Up': pt shifted up, 'Down': shifted down} '''
         pt = self._get('pt')
-        if shift not in ['Up','Down']: return pt
-
-        # TODO stop hardcoding stuff
-        # make sure vals are in range
-        pt_  = max(10., min(9000., self._get('pt')))
-        eta_ = max(-5.399, min(5.399, self._get('eta')))
-        if shift=='Down':
-            if h_down:
-                s = h_down.GetBinContent(
-                    h_down.GetXaxis().FindBin(pt_),
-                    h_down.GetYaxis().FindBin(eta_) )
-                return pt * (1. - s)
-            else: return pt 
-        elif shift=='Up':
-            if h_up:
-                s = h_up.GetBinContent(
-                    h_up.GetXaxis().FindBin(pt_),
-                    h_up.GetYaxis().FindBin(eta_) )
-                return pt * (1. + s)
-            else: return pt 
+        pts = {'' : pt, 'Up' : pt, 'Down' : pt}
+        if self.shift_down or self.shift_up:
+            # TODO stop hardcoding stuff
+            # make sure vals are in range
+            pt_  = max(10., min(9000., pt))
+            eta_ = max(-5.399, min(5.399, self._get('eta')))
+            if self.shift_down:
+                pts['Down'] = pt * (1. - self.shift_down.value(pt_, eta_))
+            if self.shift_up:
+                pts['Up'] = pt * (1. + self.shift_up.value(pt_, eta_))
+        return pts
 
 
     def area(self): return self._get('area')
@@ -655,13 +942,237 @@ class Jet(JettyCand):
     def is_tight(self):          return self._get('is_tight')
     def is_tight_lep_veto(self): return self._get('is_tightLepVeto')
     # btagging
-    def btag(self, tagname): 
-        result = False
-        try:
-            return self._get('btag_pass'+tagname)
-        except AttributeError:
-            print 'Btag "' + tagname + '" not available.'
-            print ('Print a list of available btags with:'
-                   '\n    self.event.print_available_btags()')
-            #raise
+    def btag(self, tagname):
+        return self.branches.tagger('btag_pass')[tagname][self.entry]
+
+
+
 
+## ___________________________________________________________
+class CollectionPool(object):
+    '''
+    Reuses the objects of one collection from event to event:
+        pool = CollectionPool(Muon, corrected)
+        muons = pool.get(tree, tree.muon_count)
+    returns a new Collection (a list, see below) of objects pointed at
+    entries 0 ... n-1, making new objects only when an event has more
+    candidates than any before it in the file (or the tree changes). The
+    objects of the previous event are reused, so don't hold on to them from
+    one event to the next.
+    '''
+    __slots__ = ('cls', 'args', 'collection', 'tree', 'objects', 'requested',
+                 'allocated')
+    def __init__(self, cls, *args):
+        self.cls = cls
+        self.args = args
+        self.collection = COLLECTION_CLASSES.get(cls, Collection)
+        self.tree = None
+        self.objects = []
+        # number of objects handed out, and number actually made
+        self.requested = 0
+        self.allocated = 0
+
+    def get(self, tree, n):
+        if tree is not self.tree:
+            self.tree = tree
+            self.objects = []
+        objects = self.objects
+        for i in xrange(len(objects), n):
+            objects.append(self.cls(tree, i, *self.args))
+            self.allocated += 1
+        self.requested += n
+        result = self.collection(itertools.islice(objects, n))
+        for i, obj in enumerate(result):
+            obj.entry = i
+            obj.memo.clear()
+        return result
+
+
+
+## ___________________________________________________________
+class Collection(list):
+    '''
+    The objects of one collection in an event. It's a list, so indexing and
+    iterating give the usual Dataform objects, and it also has the whole
+    collection as numpy arrays:
+        muons.column('dxy')    any variable, in the order of the list
+        muons.pt, muons.eta    the common ones (see the subclasses)
+    so selections can be written as masks, and select(mask) gives the
+    objects that pass:
+        good = muons.select((muons.pt > 20) & (muons.abs_eta < 2.4))
+    and select(permutation) reorders, e.g. by decreasing pt:
+        muons = muons.select(numpy.argsort(-muons.pt, kind='mergesort'))
+    When the list is in entry order (as made by CollectionPool) the arrays
+    are views of the branch buffers, not copies: like the objects they
+    change with the next event, so don't keep them. They are made the first
+    time they are used; sort() starts over, other changes to the list in
+    place don't (make a new collection with select instead).
+    '''
+    # order: the entries of the objects as an array, if known
+    __slots__ = ('arrays', 'order')
+    def __init__(self, objects=(), order=None):
+        super(Collection, self).__init__(objects)
+        self.arrays = {}
+        self.order = order
+
+    def sort(self, *args, **kwargs):
+        super(Collection, self).sort(*args, **kwargs)
+        self.arrays.clear()
+        self.order = None
+
+    def column(self, var):
+        ''' numpy array of _get(var) of each object '''
+        arrays = self.arrays
+        if var in arrays: return arrays[var]
+        if numpy is None: raise ImportError('Collection arrays need numpy')
+        n = len(self)
+        if n == 0:
+            result = numpy.zeros(0)
+        elif self.order is not None:
+            order = self.order
+            result = self[0].branches.array(var, int(order.max())+1)[order]
+        else:
+            entries = [obj.entry for obj in self]
+            if entries == range(n):
+                result = self[0].branches.array(var, n)
+            else:
+                result = self[0].branches.array(var, max(entries)+1)[entries]
+        arrays[var] = result
+        return result
+
+    def hlt_match_bits(self, paths):
+        ''' numpy array of hlt_match_bits(paths) of each object '''
+        bits = numpy.zeros(len(self), dtype='int64')
+        if not self: return bits
+        for bit, var in self[0].branches.hlt_matches(paths):
+            bits[self.column(var) != 0] |= bit
+        return bits
+
+    def _tagger(self, kind, name):
+        # boolean array of tagger kind+name, checked like the objects do
+        if self: self[0].branches.tagger(kind)[name]
+        return self.column(kind + name).astype(bool)
+
+    def select(self, mask):
+        '''
+        New collection of the objects where mask (a boolean array) is True,
+        or at the indices it lists
+        '''
+        mask = numpy.asarray(mask)
+        indices = (numpy.flatnonzero(mask) if mask.dtype == bool
+                   else mask.astype(numpy.intp))
+        order = self.order
+        if order is None:
+            order = numpy.array([obj.entry for obj in self], dtype=numpy.intp)
+        result = type(self)((self[i] for i in indices), order[indices])
+        for var, values in self.arrays.iteritems():
+            result.arrays[var] = values[indices]
+        return result
+
+    def ordered_by(self, var):
+        '''
+        The collection in decreasing order of var: the same order as the
+        (stable) sort(key=lambda obj: obj._get(var), reverse=True), but
+        from a stable argsort of the array, applied with select. Returns
+        itself if it's already in that order.
+        '''
+        if len(self) < 2: return self
+        if numpy is None:
+            result = type(self)(self)
+            result.sort(key=lambda obj: obj._get(var), reverse=True)
+            return result
+        permutation = numpy.argsort(-self.column(var), kind='mergesort')
+        if (numpy.diff(permutation) == 1).all(): return self
+        return self.select(permutation)
+
+## ___________________________________________________________
+class CandCollection(Collection):
+    __slots__ = ()
+    pt      = property(lambda self: self.column('pt'))
+    eta     = property(lambda self: self.column('eta'))
+    abs_eta = property(lambda self: numpy.abs(self.column('eta')))
+    phi     = property(lambda self: self.column('phi'))
+    mass    = property(lambda self: self.column('mass'))
+    charge  = property(lambda self: self.column('charge'))
+
+## ___________________________________________________________
+class MuonCollection(CandCollection):
+    '''
+    Muons; pt is corrected or not like Muon.pt(), and the isolations are
+    iso_PFr3dB_comb_rel() and iso_PFr4dB_comb_rel() of each muon
+    '''
+    __slots__ = ()
+    @property
+    def pt(self):
+        if self and self[0].corrected: return self.column('rochesterPt')
+        return self.column('pt')
+    @property
+    def iso_PFr3dB(self): return self._iso_dB('pfisolationr3')
+    @property
+    def iso_PFr4dB(self): return self._iso_dB('pfisolationr4')
+
+    def _iso_dB(self, cone):
+        key = 'iso_dB_' + cone
+        if key not in self.arrays:
+            # in float64, to round like iso_PFr4dB_comb_rel() and co.
+            column = lambda var: self.column('{0}_{1}'.format(cone,
+                var)).astype('float64')
+            self.arrays[key] = (column('sumchargedhadronpt')
+                + numpy.maximum(0., column('sumneutralhadronet')
+                    + column('sumphotonet') - 0.5 * column('sumpupt'))
+                ) / self.pt
+        return self.arrays[key]
+
+    is_tight      = property(lambda self: self.column('is_tight_muon'))
+    is_medium     = property(lambda self: self.column('is_medium_muon'))
+    is_medium2016 = property(lambda self: self.column('is_medium2016_muon'))
+    is_loose      = property(lambda self: self.column('is_loose_muon'))
+    is_global     = property(lambda self: self.column('is_global'))
+    is_tracker    = property(lambda self: self.column('is_tracker'))
+
+## ___________________________________________________________
+class ElectronCollection(CandCollection):
+    __slots__ = ()
+    is_veto   = property(lambda self: self.column('cutBasedVeto'))
+    is_loose  = property(lambda self: self.column('cutBasedLoose'))
+    is_medium = property(lambda self: self.column('cutBasedMedium'))
+    is_tight  = property(lambda self: self.column('cutBasedTight'))
+
+## ___________________________________________________________
+class JetCollection(CandCollection):
+    '''
+    Jets; pt is the nominal pt, Jet.pt(), and shifted_pt(shift) is
+    Jet.pt(shift) of each jet
+    '''
+    __slots__ = ()
+    def shifted_pt(self, shift):
+        if shift not in ('Up', 'Down'): return self.pt
+        key = 'pt_' + shift
+        if key not in self.arrays:
+            self.arrays[key] = numpy.array([jet.pt(shift) for jet in self],
+                dtype='float64')
+        return self.arrays[key]
+
+    is_loose          = property(lambda self: self.column('is_loose'))
+    is_tight          = property(lambda self: self.column('is_tight'))
+    is_tight_lep_veto = property(lambda self: self.column('is_tightLepVeto'))
+
+    def btag(self, tagname):
+        ''' Boolean array of btag(tagname) of each jet '''
+        return self._tagger('btag_pass', tagname)
+
+## ___________________________________________________________
+class TauCollection(CandCollection):
+    __slots__ = ()
+    def tau_discriminator(self, discname):
+        ''' Boolean array of tau_discriminator(discname) of each tau '''
+        return self._tagger('tdisc_', discname)
+
+# collection type of the objects of each class (default: Collection)
+COLLECTION_CLASSES = {
+    Muon     : MuonCollection,
+    Electron : ElectronCollection,
+    Photon   : CandCollection,
+    Tau      : TauCollection,
+    Jet      : JetCollection,
+}
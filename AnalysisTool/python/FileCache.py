@@ -0,0 +1,193 @@
+# AnalysisToolLight/AnalysisTool/python/FileCache.py
+'''
+Local disk cache for remote (T2) input files.
+
+The first time a remote file is opened it is copied into the cache
+directory; later opens are served from the local copy. The cache has a
+byte budget: when a new file doesn't fit, the least recently used files
+are deleted. The index (index.json in the cache directory) is protected
+by a lock file so several jobs can share one cache directory.
+
+Where files are copied from is up to the source object:
+    XRootDSource: copies root:// urls with xrdcp (the default)
+    LocalDirectorySource: copies from a local directory laid out like the
+        storage element (e.g. <dir>/store/...), so tests don't need a T2
+'''
+import fcntl
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+import hashlib
+
+from ROOT import TFile
+
+
+## _____________________________________________________________________________
+def url_path(url):
+    '''
+    Returns the path part of a root:// url, e.g.
+    root://eoscms.cern.ch//store/x.root -> /store/x.root
+    '''
+    if '://' not in url: return url
+    rest = url.split('://', 1)[1]
+    path = rest.split('/', 1)[1] if '/' in rest else ''
+    return '/' + path.lstrip('/')
+
+
+## _____________________________________________________________________________
+class XRootDSource(object):
+    '''
+    Copies remote files with xrdcp (or TFile::Cp if xrdcp isn't available)
+    '''
+    def fetch(self, url, dest):
+        try:
+            subprocess.check_call(['xrdcp', '--silent', '--force', url, dest])
+        except OSError:
+            if not TFile.Cp(url, dest, False):
+                raise IOError('Could not copy {0}'.format(url))
+
+## _____________________________________________________________________________
+class LocalDirectorySource(object):
+    '''
+    Serves remote files from a local directory that mirrors the path
+    structure of the storage element
+    '''
+    def __init__(self, rootdir):
+        self.rootdir = rootdir
+
+    def fetch(self, url, dest):
+        src = os.path.join(self.rootdir, url_path(url).lstrip('/'))
+        if not os.path.exists(src):
+            raise IOError('{0} not found in {1}'.format(url, self.rootdir))
+        shutil.copyfile(src, dest)
+
+
+## _____________________________________________________________________________
+class FileCache(object):
+    '''
+    LRU cache of remote files in cachedir, using at most max_bytes.
+    get(fname) returns the local path to open instead of fname.
+    '''
+    # constructors/helpers
+    def __init__(self, cachedir, max_bytes, source=None):
+        self.cachedir = cachedir
+        self.max_bytes = max_bytes
+        self.source = source if source is not None else XRootDSource()
+        self.indexpath = os.path.join(self.cachedir, 'index.json')
+        self.lockpath  = os.path.join(self.cachedir, 'index.lock')
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_fetched = 0
+        # the prefetch thread and the event loop may both use the cache
+        self.threadlock = threading.Lock()
+
+        if not os.path.exists(self.cachedir):
+            os.makedirs(self.cachedir)
+
+    def _read_index(self):
+        if not os.path.exists(self.indexpath): return {}
+        try:
+            with open(self.indexpath, 'r') as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def _write_index(self, index):
+        tmpname = '{0}.{1}.tmp'.format(self.indexpath, os.getpid())
+        with open(tmpname, 'w') as f:
+            json.dump(index, f)
+        os.rename(tmpname, self.indexpath)
+
+    def _locked(self, func, *args):
+        # lock against this process' other thread and against other jobs
+        with self.threadlock:
+            with open(self.lockpath, 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    return func(*args)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _local_name(self, fname):
+        return os.path.join(self.cachedir,
+            hashlib.sha1(fname).hexdigest() + '.root')
+
+    # methods
+    ## _________________________________________________________________________
+    def is_remote(self, fname):
+        return '://' in fname
+
+    ## _________________________________________________________________________
+    def get(self, fname):
+        '''
+        Returns a local path for fname, fetching it into the cache first if
+        needed. Local files, and files too big for the cache, are returned
+        unchanged.
+        '''
+        if not self.is_remote(fname): return fname
+
+        local = self._locked(self._lookup, fname)
+        if local is not None:
+            self.hits += 1
+            return local
+
+        # not cached: copy it to a temporary name (without holding the lock)
+        self.misses += 1
+        localname = self._local_name(fname)
+        tmpname = '{0}.{1}.part'.format(localname, os.getpid())
+        start = time.time()
+        self.source.fetch(fname, tmpname)
+        size = os.path.getsize(tmpname)
+        self.bytes_fetched += size
+        logging.info('    Copied {0:0.1f} MB into file cache in {1:0.1f} s'.format(
+            size/1024./1024., time.time() - start))
+
+        if size > self.max_bytes:
+            os.remove(tmpname)
+            logging.info('    File is larger than the cache; reading it '
+                'remotely.')
+            return fname
+
+        return self._locked(self._insert, fname, tmpname, localname, size)
+
+    def _lookup(self, fname):
+        index = self._read_index()
+        entry = index.get(fname)
+        if entry is None or not os.path.exists(entry['file']): return None
+        entry['last_used'] = time.time()
+        self._write_index(index)
+        return entry['file']
+
+    def _insert(self, fname, tmpname, localname, size):
+        index = self._read_index()
+        # forget entries whose files have disappeared
+        for key in [k for k, e in index.iteritems()
+            if not os.path.exists(e['file'])]:
+            del index[key]
+        index.pop(fname, None)
+
+        # evict least recently used files until the new one fits
+        used = sum(e['size'] for e in index.itervalues())
+        for key in sorted(index, key=lambda k: index[k]['last_used']):
+            if used + size <= self.max_bytes: break
+            used -= index[key]['size']
+            os.remove(index[key]['file'])
+            del index[key]
+            self.evictions += 1
+
+        os.rename(tmpname, localname)
+        index[fname] = {'file' : localname, 'size' : size,
+            'last_used' : time.time()}
+        self._write_index(index)
+        return localname
+
+    ## _________________________________________________________________________
+    def log_stats(self):
+        logging.info('File cache ({0}): {1} hits, {2} misses, {3} evictions, '
+            '{4:0.1f} MB copied'.format(self.cachedir, self.hits, self.misses,
+                self.evictions, self.bytes_fetched/1024./1024.))
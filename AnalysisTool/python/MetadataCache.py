@@ -0,0 +1,238 @@
+# AnalysisToolLight/AnalysisTool/python/MetadataCache.py
+'''
+Per-file job metadata (what AnalysisBase needs from the AC1Binfo and
+AC1Blumi trees before the event loop) and a sidecar cache for it.
+
+The cache is a json file keyed by file path. Each entry also stores the
+size and modification time of the file, and is only used if those still
+match, so files that were rewritten are scanned again.
+'''
+import json
+import logging
+import multiprocessing
+import os
+
+from ROOT import TFile, gSystem, FileStat_t
+from tools.tree_arrays import sum_branches
+from Skim import read_skim_cutflow
+
+# bump this whenever the contents of a metadata entry change
+CACHE_VERSION = 3
+
+
+## _____________________________________________________________________________
+def file_signature(fname):
+    '''
+    Returns (size, mtime) of a local or remote (xrootd) file,
+    or None if the file can't be stat'ed.
+    '''
+    if '://' not in fname:
+        try:
+            st = os.stat(fname)
+        except OSError:
+            return None
+        return (st.st_size, int(st.st_mtime))
+
+    # remote files: let ROOT's system plugin for the protocol do the stat
+    stat = FileStat_t()
+    if gSystem.GetPathInfo(fname, stat) != 0: return None
+    return (stat.fSize, stat.fMtime)
+
+
+## _____________________________________________________________________________
+def scan_file_metadata(fname, treedir, infoname, luminame, treename):
+    '''
+    Opens one input file and returns a dict with:
+        isdata, cmsswversion, source_dataset (from the first info entry)
+        numinfos, nevents_filled (summed over the info tree)
+        numlumis, nevents, sumweights (summed over the lumi tree)
+        nentries (number of entries in the event tree)
+        skim_cutflow (for skims written with --write-skim: the cutflow
+            counts of the rejected events, see Skim.py; otherwise None)
+    '''
+    tfile = TFile.Open(fname)
+    if not tfile or tfile.IsZombie():
+        raise IOError('Could not open file {0}'.format(fname))
+
+    infotree = tfile.Get('{0}/{1}'.format(treedir, infoname))
+    lumitree = tfile.Get('{0}/{1}'.format(treedir, luminame))
+    evttree  = tfile.Get('{0}/{1}'.format(treedir, treename))
+    for name, tree in [(infoname, infotree), (luminame, lumitree),
+        (treename, evttree)]:
+        if not tree:
+            tfile.Close()
+            raise IOError('No {0}/{1} tree in {2}'.format(treedir, name, fname))
+
+    info = {}
+    infotree.GetEntry(0)
+    info['isdata'] = bool(infotree.isdata)
+    info['cmsswversion'] = str(infotree.CMSSW_version)
+    info['source_dataset'] = str(infotree.source_dataset)
+
+    # sums are done on whole branch arrays (see tools/tree_arrays.py)
+    info['numinfos'] = infotree.GetEntries()
+    info['nevents_filled'] = int(round(
+        sum_branches(infotree, ['nevents_filled'])[0]))
+
+    info['numlumis'] = lumitree.GetEntries()
+    nevents, sumweights = sum_branches(lumitree,
+        ['lumi_nevents', 'lumi_sumweights'])
+    info['nevents'] = int(round(nevents))
+    info['sumweights'] = float(sumweights)
+
+    info['nentries'] = evttree.GetEntries()
+
+    # the info trees of a skim describe the original sample, but only the
+    #     skimmed events are left to process
+    info['skim_cutflow'] = read_skim_cutflow(tfile, treedir)
+    if info['skim_cutflow'] is not None:
+        info['nevents_filled'] = info['nentries']
+
+    tfile.Close()
+    return info
+
+
+## _____________________________________________________________________________
+class MetadataCache(object):
+    '''
+    Sidecar cache of scan_file_metadata results
+    '''
+    # constructors/helpers
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.changed = False
+
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    contents = json.load(f)
+                if contents.get('version') == CACHE_VERSION:
+                    self.entries = contents.get('files', {})
+            except (IOError, ValueError):
+                logging.info('    Could not read metadata cache {0}; '
+                    'it will be rebuilt.'.format(self.path))
+
+    # methods
+    ## _________________________________________________________________________
+    def get(self, fname, signature):
+        '''
+        Returns the cached metadata for fname if its size and mtime
+        still match signature, otherwise None.
+        '''
+        entry = self.entries.get(fname)
+        if (signature is not None and entry is not None
+            and entry['size'] == signature[0]
+            and entry['mtime'] == signature[1]):
+            self.hits += 1
+            return entry['info']
+        self.misses += 1
+        return None
+
+    ## _________________________________________________________________________
+    def put(self, fname, signature, info):
+        # files we can't stat can't be validated later, so don't store them
+        if signature is None: return
+        self.entries[fname] = {
+            'size'  : signature[0],
+            'mtime' : signature[1],
+            'info'  : info,
+        }
+        self.changed = True
+
+    ## _________________________________________________________________________
+    def save(self):
+        '''
+        Writes the cache to disk if anything was added. The file is written
+        under a temporary name and then renamed, so jobs running at the same
+        time never see a half-written cache.
+        '''
+        if not (self.path and self.changed): return
+        cachedir = os.path.dirname(self.path)
+        if cachedir and not os.path.exists(cachedir):
+            os.makedirs(cachedir)
+        tmpname = '{0}.{1}.tmp'.format(self.path, os.getpid())
+        with open(tmpname, 'w') as f:
+            json.dump({'version' : CACHE_VERSION, 'files' : self.entries}, f)
+        os.rename(tmpname, self.path)
+        self.changed = False
+
+
+## _____________________________________________________________________________
+def _scan_worker(task):
+    '''
+    Runs scan_file_metadata in a pool worker. Errors are returned instead of
+    raised so one bad file doesn't stop the others from being scanned.
+    '''
+    try:
+        return scan_file_metadata(*task), None
+    except Exception as e:
+        return None, '{0}: {1}'.format(type(e).__name__, e)
+
+
+## _____________________________________________________________________________
+def collect_metadata(filenames, treedir, infoname, luminame, treename,
+    cachepath=None, workers=1):
+    '''
+    Returns a list with the metadata of each file in filenames (in the same
+    order), reading only files that are not in the cache at cachepath or
+    have changed since they were cached. Files that need to be read are
+    scanned by a pool of up to "workers" processes.
+    Files that could not be read have None in the returned list; they are
+    all reported together at the end.
+    '''
+    cache = MetadataCache(cachepath)
+    results = [None for fname in filenames]
+    signatures = {}
+    toscan = []
+    for f, fname in enumerate(filenames):
+        signatures[f] = file_signature(fname)
+        info = cache.get(fname, signatures[f])
+        if info is None: toscan += [f]
+        else: results[f] = info
+
+    # scan whatever wasn't cached
+    tasks = [(filenames[f], treedir, infoname, luminame, treename)
+        for f in toscan]
+    if toscan:
+        logging.info('Scanning {0} files with {1} worker(s)...'.format(
+            len(toscan), min(workers, len(toscan))))
+    if workers > 1 and len(toscan) > 1:
+        # ROOT isn't thread safe, so use processes rather than threads.
+        #     map keeps the results in the same order as the tasks
+        pool = multiprocessing.Pool(min(workers, len(toscan)))
+        try:
+            scanned = pool.map(_scan_worker, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        scanned = [_scan_worker(task) for task in tasks]
+
+    failures = []
+    for f, (info, error) in zip(toscan, scanned):
+        if error is not None:
+            failures += [(f, error)]
+            continue
+        results[f] = info
+        cache.put(filenames[f], signatures[f], info)
+
+    if cachepath:
+        logging.info('    Metadata cache: {0} hits, {1} misses ({2})'.format(
+            cache.hits, cache.misses, cachepath))
+        cache.save()
+
+    if failures:
+        logging.info('       *   ')
+        logging.info('    *******')
+        logging.info('    WARNING: {0} of {1} input files could not be '
+            'read:'.format(len(failures), len(filenames)))
+        for f, error in failures:
+            logging.info('        file {0}: {1}'.format(f+1, filenames[f]))
+            logging.info('            {0}'.format(error))
+        logging.info('    *******')
+        logging.info('       *   ')
+
+    return results
@@ -0,0 +1,156 @@
+# AnalysisToolLight/AnalysisTool/python/ReadAhead.py
+'''
+I/O helpers for the event loop:
+    configure_tree_cache: sets up a TTreeCache on the event tree, sized to
+        the branches that are actually read, so baskets come in a few large
+        reads instead of one round trip each
+    FilePrefetcher: opens (and optionally warms) the next input file in a
+        background thread while the current one is being processed
+'''
+import logging
+import threading
+import time
+
+import ROOT
+from ROOT import TFile
+
+# bounds for the automatically sized tree cache
+MIN_CACHE_BYTES = 1*1024*1024
+MAX_CACHE_BYTES = 256*1024*1024
+
+## _____________________________________________________________________________
+def _release_gil(method):
+    '''
+    Lets PyROOT drop the GIL while method runs, so the background thread
+    doesn't block the event loop while it waits on the network.
+    (_threaded is the PyROOT name, __release_gil__ the cppyy one.)
+    '''
+    for attr in ['_threaded', '__release_gil__']:
+        try:
+            setattr(method, attr, True)
+        except (AttributeError, TypeError):
+            pass
+
+
+## _____________________________________________________________________________
+def active_bytes_per_entry(tree):
+    '''
+    Returns the compressed size per entry of the branches of tree that are
+    switched on (see BranchUsage.py).
+    '''
+    nentries = max(1, tree.GetEntries())
+    active = sum(b.GetZipBytes() for b in tree.GetListOfBranches()
+        if tree.GetBranchStatus(b.GetName()))
+    return float(active) / nentries
+
+## _____________________________________________________________________________
+def configure_tree_cache(tree, cachesize_mb=0):
+    '''
+    Turns on the TTreeCache for the active branches of tree.
+    cachesize_mb > 0 sets the size explicitly; 0 sizes it to hold one
+    cluster (autoflush block) of the active branches; < 0 turns it off.
+    Returns the cache size in bytes.
+    '''
+    if cachesize_mb < 0:
+        tree.SetCacheSize(0)
+        return 0
+
+    if cachesize_mb > 0:
+        cachesize = int(cachesize_mb*1024*1024)
+    else:
+        # entries per cluster: autoflush is either a number of entries (> 0)
+        #     or a number of bytes (< 0)
+        autoflush = tree.GetAutoFlush()
+        if autoflush > 0:
+            cluster = autoflush
+        else:
+            totbytes = max(1., float(tree.GetZipBytes()))
+            cluster = tree.GetEntries() * min(1., -autoflush / totbytes)
+        cachesize = int(active_bytes_per_entry(tree) * max(1, cluster))
+        cachesize = max(MIN_CACHE_BYTES, min(MAX_CACHE_BYTES, cachesize))
+
+    tree.SetCacheSize(cachesize)
+    # only the switched-on branches go into the cache; no learning phase
+    branches = [b.GetName() for b in tree.GetListOfBranches()]
+    active = [b for b in branches if tree.GetBranchStatus(b)]
+    if len(active) == len(branches):
+        tree.AddBranchToCache('*', True)
+    else:
+        for name in active:
+            tree.AddBranchToCache(name, True)
+    tree.StopCacheLearningPhase()
+    return cachesize
+
+
+## _____________________________________________________________________________
+class FilePrefetcher(object):
+    '''
+    Opens input files, optionally in the background ahead of time:
+        prefetcher.request(fname)  # start opening fname in a thread
+        tfile = prefetcher.open(fname)  # wait for it (or open it now)
+    With warm_mb > 0, the background thread also reads up to warm_mb MB of
+    baskets of the event tree (treepath) so the first cluster is in memory.
+    If a file cache (see FileCache.py) is given, remote files are opened
+    from it, so the background thread also does the copy into the cache.
+    The time open() spent waiting is kept in self.wait_times.
+    '''
+    # constructors/helpers
+    def __init__(self, treepath, prefetch=True, warm_mb=0, filecache=None):
+        self.treepath = treepath
+        self.prefetch = prefetch
+        self.warm_mb = warm_mb
+        self.filecache = filecache
+        self.pending = {}
+        self.wait_times = []
+
+        if self.prefetch:
+            if hasattr(ROOT, 'EnableThreadSafety'): ROOT.EnableThreadSafety()
+            _release_gil(TFile.Open)
+            _release_gil(ROOT.TTree.LoadBaskets)
+
+    def _local(self, fname):
+        return self.filecache.get(fname) if self.filecache else fname
+
+    def _open(self, fname, result):
+        try:
+            tfile = TFile.Open(self._local(fname))
+            if tfile and not tfile.IsZombie() and self.warm_mb > 0:
+                tree = tfile.Get(self.treepath)
+                if tree: tree.LoadBaskets(int(self.warm_mb*1024*1024))
+            result['tfile'] = tfile
+        except Exception as e:
+            result['error'] = e
+
+    # methods
+    ## _________________________________________________________________________
+    def request(self, fname):
+        if not self.prefetch or fname in self.pending: return
+        result = {}
+        thread = threading.Thread(target=self._open, args=(fname, result))
+        thread.daemon = True
+        thread.start()
+        self.pending[fname] = (thread, result)
+
+    ## _________________________________________________________________________
+    def open(self, fname):
+        start = time.time()
+        prefetched = fname in self.pending
+        if prefetched:
+            thread, result = self.pending.pop(fname)
+            thread.join()
+            if 'error' in result: raise result['error']
+            tfile = result.get('tfile')
+        else:
+            tfile = TFile.Open(self._local(fname))
+        wait = time.time() - start
+        self.wait_times += [wait]
+
+        if not tfile or tfile.IsZombie():
+            raise IOError('Could not open file {0}'.format(fname))
+        logging.info('    Waited {0:0.2f} s for file to open{1}'.format(wait,
+            ' (prefetched)' if prefetched else ''))
+        return tfile
+
+    ## _________________________________________________________________________
+    def total_wait(self):
+        return sum(self.wait_times)
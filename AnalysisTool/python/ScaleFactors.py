@@ -9,6 +9,11 @@ import os.path
 import ROOT
 from collections import OrderedDict, namedtuple
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 ## _____________________________________________________________________________
 class ScaleFactor(object):
     '''
@@ -76,6 +81,21 @@ class PileupWeights(ScaleFactor):
         else:
             return self.pileup_scale[thisindex] if len(self.pileup_scale) > thisindex else 0.
 
+    ## _________________________________________________________________________
+    def get_weights(self, numtrueinteractions):
+        ''' get_weight of each entry of an array (numpy) '''
+        numtrue = numpy.asarray(numtrueinteractions, dtype='float64')
+        if self.error: return numpy.ones(len(numtrue))
+        if self.shift == 'Down':  scale = self.pileup_scale_down
+        elif self.shift == 'Up':  scale = self.pileup_scale_up
+        else:                     scale = self.pileup_scale
+        scale = numpy.array(scale + [0.])
+        # round halves up like round() (numtrue is never negative)
+        index = numpy.floor(numtrue)
+        index += (numtrue - index) >= 0.5
+        index = numpy.minimum(index, len(scale) - 1).astype('int64')
+        return scale[index]
+
 
 ## _____________________________________________________________________________
 class VariablePileupWeights(ScaleFactor):
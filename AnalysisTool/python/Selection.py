@@ -0,0 +1,610 @@
+# AnalysisToolLight/AnalysisTool/python/Selection.py
+'''
+The event selection and preselection as a plan of named steps, compiled
+once from a cuts dictionary (compile_selection):
+    Cut     : the event stops here if it fails; if it passes it's counted
+              in the cutflow (for cuts with a counter)
+    Counter : counted in the cutflow if it passes, never stops the event
+    Build   : makes the good objects and pairs that later steps (and
+              per_event_action) use
+The string choices of the cuts (cMuID, cMuIsoType and cMuIsoLevel, cEID)
+are resolved when the plan is compiled, so a bad choice fails right away,
+and the steps register their own cutflow counters (register).
+
+The plan runs either on one event, through the Dataform objects:
+    selection.run(analysis)
+filling analysis.good_muons, dimuon_pairs etc. and stopping at the first
+cut that fails, or on a batch of events at once, as numpy masks:
+    passed, state = selection.run_batch(analysis, batch)
+with one entry per event in passed. A batch is anything that, like the
+tree, has an attribute per branch: one value per event for event branches,
+the values of all candidates of the events one after the other for
+collection branches; plus size (the number of events) and offsets(count
+branch), where each event's candidates start and end (see
+ColumnarCache.ColumnarBatch). In state, good_muons and good_electrons are
+masks of the candidates; batches don't build jets or electron and jet
+pairs, which don't change which events pass.
+
+For an event that passed in a batch,
+    selection.build_from_batch(analysis, state, index)
+fills analysis.good_muons, dimuon_pairs etc. from the state of the batch
+and builds the rest (jets and the other pairs) without running the cuts
+again.
+'''
+import itertools
+import logging
+from collections import OrderedDict
+
+from Dataform import MUON_IDS, MUON_PF_DB_ISO, resolve_paths
+from tools.fourvector import FourVector
+from tools.pairs import CandidatePairs
+from tools.tools import cleaning_mask
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# variable of each electron ID choice (cEID); the others (the mva IDs)
+#     aren't in the ntuples, so no electron passes them
+ELECTRON_IDS = OrderedDict([
+    ('cbloose',  'cutBasedLoose'),
+    ('cbmedium', 'cutBasedMedium'),
+    ('cbtight',  'cutBasedTight'),
+])
+
+
+## _____________________________________________________________________________
+class Cut(object):
+    '''
+    Stops the event unless test(analysis, state) is True, and counts it
+    under counter if it passes. test_batch is the version for batches
+    (state['batch']), returning a mask of the events; by default test
+    itself, for tests that only compare things in state.
+    '''
+    __slots__ = ('name', 'test', 'test_batch', 'counter', 'label')
+    def __init__(self, name, test, test_batch=None, counter=None, label=None):
+        self.name = name
+        self.test = test
+        self.test_batch = test_batch or test
+        self.counter = counter
+        self.label = label
+
+    def register(self, cutflow):
+        if self.counter: cutflow.add(self.counter, self.label)
+
+    def run(self, analysis, state):
+        if not self.test(analysis, state): return False
+        if self.counter: analysis.cutflow.increment(self.counter)
+        return True
+
+    def run_batch(self, analysis, state, alive):
+        alive = alive & self.test_batch(analysis, state)
+        if self.counter:
+            analysis.cutflow.increment(self.counter, int(alive.sum()))
+        return alive
+
+## _____________________________________________________________________________
+class Counter(Cut):
+    '''
+    Counts the event under counter if test(analysis, state) is True,
+    without stopping it
+    '''
+    __slots__ = ()
+    def __init__(self, counter, label, test, test_batch=None):
+        super(Counter, self).__init__(counter, test, test_batch, counter, label)
+
+    def run(self, analysis, state):
+        if self.test(analysis, state): analysis.cutflow.increment(self.counter)
+        return True
+
+    def run_batch(self, analysis, state, alive):
+        analysis.cutflow.increment(self.counter,
+            int((alive & self.test_batch(analysis, state)).sum()))
+        return alive
+
+## _____________________________________________________________________________
+class Build(object):
+    '''
+    Makes products for the later steps: build(analysis, state) for one
+    event, build_batch(analysis, state) for a batch (None: nothing), and
+    from_batch(analysis, state, index) the products of event index of a
+    batch from its state (None: build them with build)
+    '''
+    __slots__ = ('name', 'build', 'build_batch', 'from_batch')
+    def __init__(self, name, build, build_batch=None, from_batch=None):
+        self.name = name
+        self.build = build
+        self.build_batch = build_batch
+        self.from_batch = from_batch
+
+    def register(self, cutflow): pass
+
+    def run(self, analysis, state):
+        self.build(analysis, state)
+        return True
+
+    def run_batch(self, analysis, state, alive):
+        if self.build_batch: self.build_batch(analysis, state)
+        return alive
+
+
+## _____________________________________________________________________________
+class Selection(object):
+    '''
+    A compiled plan of steps (see the module docstring)
+    '''
+    def __init__(self, steps):
+        self.steps = steps
+
+    def register(self, cutflow):
+        for step in self.steps: step.register(cutflow)
+
+    def run(self, analysis):
+        ''' Returns whether the current event passes; stops at the first
+            cut it fails '''
+        state = {}
+        for step in self.steps:
+            if not step.run(analysis, state): return False
+        return True
+
+    def build_from_batch(self, analysis, state, index):
+        ''' Builds the products of the current event, event index of a batch
+            that passed run_batch (with state), without testing or counting
+            anything '''
+        products = {}
+        for step in self.steps:
+            if not isinstance(step, Build): continue
+            if step.from_batch: step.from_batch(analysis, state, index)
+            else:               step.build(analysis, products)
+
+    def run_batch(self, analysis, batch):
+        ''' Returns the mask of the events of batch that pass, and the
+            state (masks and counts of the steps) '''
+        if numpy is None: raise ImportError('Selection.run_batch needs numpy')
+        state = {'batch' : batch}
+        alive = numpy.ones(batch.size, dtype=bool)
+        for step in self.steps:
+            alive = step.run_batch(analysis, state, alive)
+            # the counters of the rest of the steps would all be 0
+            if not alive.any(): break
+        return alive, state
+
+
+## _____________________________________________________________________________
+def _choice(key, value, choices):
+    if value not in choices:
+        raise ValueError('compile_selection: "{0}" not an available choice for '
+            '{1}. Available choices are {2}.'.format(value, key,
+                ', '.join('"{0}"'.format(c) for c in choices)))
+    return choices[value]
+
+## _____________________________________________________________________________
+def _flag(name):
+    # test of a flag (or mask of flags) set by an earlier Build
+    return lambda analysis, state: state[name]
+
+## _____________________________________________________________________________
+def _float(batch, name):
+    # float64, so that sums and comparisons round like the python floats of
+    #     the Dataform objects
+    return numpy.asarray(getattr(batch, name), dtype='float64')
+
+## _____________________________________________________________________________
+def _per_event(mask, offsets):
+    # number of candidates of each event where mask is True
+    total = numpy.zeros(len(mask)+1, dtype='int64')
+    numpy.cumsum(mask, out=total[1:])
+    return total[offsets[1:]] - total[offsets[:-1]]
+
+## _____________________________________________________________________________
+def _fired(batch, prefix, paths, size):
+    # whether any of the paths (branches prefix+path) is set, per entry
+    fired = numpy.zeros(size, dtype=bool)
+    for bit, name in resolve_paths(batch, prefix, paths):
+        fired |= numpy.asarray(getattr(batch, name)) != 0
+    return fired
+
+## _____________________________________________________________________________
+def _offsets(batch, counter):
+    # offsets of a collection, or no candidates if it isn't in the batch
+    try:
+        return batch.offsets(counter)
+    except AttributeError:
+        return numpy.zeros(batch.size+1, dtype='int64')
+
+## _____________________________________________________________________________
+def pairs_in_events(mask, offsets):
+    '''
+    All pairs (i, j), i < j, of the candidates where mask is True, within
+    each event, in the order itertools.combinations gives them. Returns the
+    index arrays first and second (into the candidates) and the event of
+    each pair.
+    '''
+    index = numpy.flatnonzero(mask)
+    counts = _per_event(mask, offsets)
+    event = numpy.repeat(numpy.arange(len(counts)), counts)
+    position = numpy.arange(len(index))
+    # the partners of each candidate are the ones after it in its event
+    npartners = numpy.cumsum(counts)[event] - position - 1
+    first = numpy.repeat(position, npartners)
+    starts = numpy.repeat(numpy.cumsum(npartners) - npartners, npartners)
+    second = first + 1 + (numpy.arange(len(first)) - starts)
+    return index[first], index[second], event[first]
+
+
+## _____________________________________________________________________________
+def compile_selection(cuts):
+    '''
+    Returns the Selection of event selection and preselection with the
+    thresholds and choices of the cuts dictionary
+    '''
+    muon_id = _choice('cMuID', cuts['cMuID'], MUON_IDS)
+    _choice('cMuIsoType', cuts['cMuIsoType'], {'PF_dB' : None})
+    muon_iso = _choice('cMuIsoLevel', cuts['cMuIsoLevel'], MUON_PF_DB_ISO)
+    electron_id = ELECTRON_IDS.get(cuts['cEID'])
+    if electron_id is None:
+        logging.info('    WARNING: electron ID "{0}" is not in the ntuples: no '
+            'electron will pass.'.format(cuts['cEID']))
+
+    #############################
+    # Trigger ###################
+    #############################
+    def passes_trigger(analysis, state):
+        return analysis.event.passes_HLTs(analysis.hltriggers)
+    def passes_trigger_batch(analysis, state):
+        batch = state['batch']
+        return _fired(batch, 'passes_', analysis.hltriggers, batch.size)
+
+    #############################
+    # Primary vertices ##########
+    #############################
+    def good_vertex(analysis, state):
+        pv = analysis.vertices[0]
+        return pv.n_dof() > cuts['cVtxNdf'] and pv.z() < cuts['cVtxZ']
+    def good_vertex_batch(analysis, state):
+        batch = state['batch']
+        offsets = batch.offsets('primvertex_count')
+        has_pv = offsets[1:] > offsets[:-1]
+        first = offsets[:-1][has_pv]
+        result = numpy.zeros(batch.size, dtype=bool)
+        result[has_pv] = ((_float(batch, 'primvertex_ndof')[first]
+            > cuts['cVtxNdf']) & (_float(batch, 'primvertex_z')[first]
+            < cuts['cVtxZ']))
+        return result
+
+    #############################
+    # MUONS #####################
+    #############################
+    def build_muons(analysis, state):
+        # loop over muons and save the good ones
+        isGAndTr = False
+        isPtCutOK = False
+        isEtaCutOK = False
+        nMuPtEtaMax = 0
+        isIDAndIsoOK = False
+        for muon in analysis.muons:
+            # muon cuts
+            if not (muon.is_global() and muon.is_tracker()): continue
+            isGAndTr = True
+            if muon.pt() < cuts['cMuPt']: continue
+            isPtCutOK = True
+            if muon.abs_eta() > cuts['cMuEta']: continue
+            isEtaCutOK = True
+
+            # check muon ID and isolation
+            if not (muon._get(muon_id)
+                and muon.iso_PFr4dB_comb_rel() < muon_iso): continue
+            isIDAndIsoOK = True
+
+            # make sure at least one HLT-matched muon passes extra cuts
+            if (muon.pt() > cuts['cMuPtMax']
+                and muon.abs_eta() < cuts['cMuEtaMax']
+                and muon.matches_HLTs(analysis.hltriggers)): nMuPtEtaMax += 1
+
+            # if we get to this point, push muon into goodMuons
+            analysis.good_muons += [muon]
+        state.update(isGAndTr=isGAndTr, isPtCutOK=isPtCutOK,
+            isEtaCutOK=isEtaCutOK, isIDAndIsoOK=isIDAndIsoOK,
+            nMuPtEtaMax=nMuPtEtaMax, nGoodMuons=len(analysis.good_muons))
+
+    def build_muons_batch(analysis, state):
+        batch = state['batch']
+        offsets = _offsets(batch, 'muon_count')
+        if not offsets[-1]:
+            # no muons in the batch (or no muon collection)
+            none = numpy.zeros(batch.size, dtype=bool)
+            state.update(isGAndTr=none, isPtCutOK=none, isEtaCutOK=none,
+                isIDAndIsoOK=none, nMuPtEtaMax=numpy.zeros(batch.size, 'int64'),
+                good_muons=numpy.zeros(0, dtype=bool), muon_offsets=offsets,
+                nGoodMuons=numpy.zeros(batch.size, 'int64'),
+                muon_pt=numpy.zeros(0))
+            return
+        pt = _float(batch, 'muon_rochesterPt'
+            if analysis.use_rochester_corrections else 'muon_pt')
+        abs_eta = numpy.abs(_float(batch, 'muon_eta'))
+        iso = lambda var: _float(batch, 'muon_pfisolationr4_' + var)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            isoval = (iso('sumchargedhadronpt') + numpy.maximum(0.,
+                iso('sumneutralhadronet') + iso('sumphotonet')
+                - 0.5 * iso('sumpupt'))) / pt
+
+        # the same cuts one after the other, as masks of the muons
+        passed = ((numpy.asarray(batch.muon_is_global) != 0)
+            & (numpy.asarray(batch.muon_is_tracker) != 0))
+        state['isGAndTr'] = _per_event(passed, offsets) > 0
+        passed &= ~(pt < cuts['cMuPt'])
+        state['isPtCutOK'] = _per_event(passed, offsets) > 0
+        passed &= ~(abs_eta > cuts['cMuEta'])
+        state['isEtaCutOK'] = _per_event(passed, offsets) > 0
+        passed &= ((numpy.asarray(getattr(batch, 'muon_' + muon_id)) != 0)
+            & (isoval < muon_iso))
+        state['isIDAndIsoOK'] = _per_event(passed, offsets) > 0
+        leading = (passed & (pt > cuts['cMuPtMax'])
+            & (abs_eta < cuts['cMuEtaMax'])
+            & _fired(batch, 'muon_matches_', analysis.hltriggers, len(pt)))
+        state['nMuPtEtaMax'] = _per_event(leading, offsets)
+        state['good_muons'] = passed
+        state['muon_offsets'] = offsets
+        state['nGoodMuons'] = _per_event(passed, offsets)
+        state['muon_pt'] = pt
+
+    def muons_from_batch(analysis, state, index):
+        # the good muons in the order of the collection
+        good = state['good_muons'][state['muon_offsets'][index]:]
+        analysis.good_muons += [muon for muon in analysis.muons
+            if good[muon.entry]]
+
+    #############################
+    # ELECTRONS #################
+    #############################
+    def build_electrons(analysis, state):
+        # loop over electrons and save the good ones
+        for electron in analysis.electrons:
+            # electron cuts
+            if electron.pt() < cuts['cEPt']: continue
+            if electron.abs_eta() > cuts['cEEta']: continue
+            # check electron id
+            if not (electron_id and electron._get(electron_id)): continue
+            # sync
+            if not (electron.abs_eta() < 1.4442
+                or (electron.abs_eta() < 2.5 and electron.abs_eta() > 1.566)):
+                continue
+            # if we get to this point, push electron into goodElectrons
+            analysis.good_electrons += [electron]
+        state['nGoodElectrons'] = len(analysis.good_electrons)
+
+    def build_electrons_batch(analysis, state):
+        batch = state['batch']
+        offsets = _offsets(batch, 'electron_count')
+        passed = numpy.zeros(offsets[-1], dtype=bool)
+        if electron_id and offsets[-1]:
+            abs_eta = numpy.abs(_float(batch, 'electron_eta'))
+            passed = (~(_float(batch, 'electron_pt') < cuts['cEPt'])
+                & ~(abs_eta > cuts['cEEta'])
+                & (numpy.asarray(getattr(batch, 'electron_' + electron_id))
+                   != 0)
+                & ((abs_eta < 1.4442) | ((abs_eta < 2.5) & (abs_eta > 1.566))))
+        state['good_electrons'] = passed
+        state['electron_offsets'] = offsets
+        state['nGoodElectrons'] = _per_event(passed, offsets)
+
+    def electrons_from_batch(analysis, state, index):
+        good = state['good_electrons'][state['electron_offsets'][index]:]
+        analysis.good_electrons += [electron
+            for electron in analysis.electrons if good[electron.entry]]
+
+    #############################
+    # JETS ######################
+    #############################
+    def build_jets(analysis, state):
+        # loop over jets
+        candidates = []
+        for jet in analysis.jets:
+            # jet cuts
+            if jet.pt(analysis.jet_shift) < cuts['cJetPt']: continue
+            if jet.abs_eta() > cuts['cJetEta']: continue
+            if not jet.is_loose(): continue
+            candidates += [jet]
+
+        # jet cleaning
+        # clean jets against our selected muons, electrons (all jet x lepton
+        #     delta Rs at once)
+        clean = cleaning_mask(candidates,
+            analysis.good_muons + analysis.good_electrons, cuts['cDeltaR'])
+        for jet, jetIsClean in zip(candidates, clean):
+            if not jetIsClean: continue
+
+            # save it
+            analysis.good_jets += [jet]
+
+            # btag
+            if (jet.btag(cuts['cBJetAlg'])
+                and jet.abs_eta() < cuts['cBJetEta']
+                and jet.pt(analysis.jet_shift) > cuts['cBJetPt']):
+                analysis.good_bjets += [jet]
+
+    #############################
+    # DIMUON PAIRS ##############
+    #############################
+    def build_dimuon_pairs(analysis, state):
+        if numpy is None: return build_dimuon_pairs_loop(analysis, state)
+        # all (non-ordered) pairs of 2 muons in goodMuons at once
+        pairs = CandidatePairs(analysis.good_muons)
+        diMuonP4 = pairs.four_vector()
+        # require opposite sign
+        passed = ~(pairs.charge_product() > 0)
+        isChargeMuCutOK = bool(passed.any())
+#        # require from same PV
+#        dz = pairs.values(lambda muon: muon.dz())
+#        passed &= ~(numpy.abs(dz[pairs.first] - dz[pairs.second]) > 0.14)
+        isSamePVMuCutOK = isChargeMuCutOK
+        # require min pT and min InvMass
+        passed &= ~(diMuonP4.M() < cuts['cDiMuInvMass'])
+        isInvMassMuCutOK = bool(passed.any())
+        passed &= ~(diMuonP4.Pt() < cuts['cDiMuPt'])
+        isPtDiMuCutOK = bool(passed.any())
+
+        analysis.dimuon_pairs += pairs.ordered(passed)
+        state.update(isChargeMuCutOK=isChargeMuCutOK,
+            isSamePVMuCutOK=isSamePVMuCutOK, isInvMassMuCutOK=isInvMassMuCutOK,
+            isPtDiMuCutOK=isPtDiMuCutOK,
+            nDimuonPairs=len(analysis.dimuon_pairs))
+
+    def build_dimuon_pairs_loop(analysis, state):
+        # loop over all possible pairs of muons
+        isChargeMuCutOK = False
+        isSamePVMuCutOK = False
+        isInvMassMuCutOK = False
+        isPtDiMuCutOK = False
+
+        # iterate over every (non-ordered) pair of 2 muons in goodMuons
+        for p in itertools.combinations(enumerate(analysis.good_muons), 2):
+            (i, muon_i), (j, muon_j) = p
+            # require opposite sign
+            if muon_i.charge() * muon_j.charge() > 0: continue
+            isChargeMuCutOK = True
+#            # require from same PV
+#            if abs(muon_i.dz() - muon_j.dz()) > 0.14: continue
+            isSamePVMuCutOK = True
+            # create composite four-vector
+            diMuonP4 = muon_i.four_vector() + muon_j.four_vector()
+            # require min pT and min InvMass
+            if diMuonP4.M() < cuts['cDiMuInvMass']: continue
+            isInvMassMuCutOK = True
+            if diMuonP4.Pt() < cuts['cDiMuPt']: continue
+            isPtDiMuCutOK = True
+
+            goodpair = (i, j) if muon_i.pt() > muon_j.pt() else (j, i)
+            analysis.dimuon_pairs += [goodpair]
+        state.update(isChargeMuCutOK=isChargeMuCutOK,
+            isSamePVMuCutOK=isSamePVMuCutOK, isInvMassMuCutOK=isInvMassMuCutOK,
+            isPtDiMuCutOK=isPtDiMuCutOK,
+            nDimuonPairs=len(analysis.dimuon_pairs))
+
+    def build_dimuon_pairs_batch(analysis, state):
+        batch = state['batch']
+        first, second, event = pairs_in_events(state['good_muons'],
+            _offsets(batch, 'muon_count'))
+        count = lambda mask: numpy.bincount(event[mask], minlength=batch.size)
+        if not len(first):
+            # no pairs (the muon branches may not even be there)
+            none = numpy.zeros(batch.size, dtype=bool)
+            state.update(isChargeMuCutOK=none, isSamePVMuCutOK=none,
+                isInvMassMuCutOK=none, isPtDiMuCutOK=none,
+                nDimuonPairs=numpy.zeros(batch.size, 'int64'),
+                dimuon_pairs=(first, second, event))
+            return
+        charge = _float(batch, 'muon_charge')
+        pt = state['muon_pt']
+        eta = _float(batch, 'muon_eta')
+        phi = _float(batch, 'muon_phi')
+        mass = _float(batch, 'muon_mass')
+        diMuonP4 = (
+            FourVector.from_pt_eta_phi_m(pt[first], eta[first], phi[first],
+                mass[first])
+            + FourVector.from_pt_eta_phi_m(pt[second], eta[second],
+                phi[second], mass[second]))
+        passed = ~(charge[first] * charge[second] > 0)
+        state['isChargeMuCutOK'] = count(passed) > 0
+        state['isSamePVMuCutOK'] = state['isChargeMuCutOK']
+        passed &= ~(diMuonP4.M() < cuts['cDiMuInvMass'])
+        state['isInvMassMuCutOK'] = count(passed) > 0
+        passed &= ~(diMuonP4.Pt() < cuts['cDiMuPt'])
+        state['isPtDiMuCutOK'] = count(passed) > 0
+        state['nDimuonPairs'] = count(passed)
+        state['dimuon_pairs'] = (first[passed], second[passed], event[passed])
+
+    def dimuon_pairs_from_batch(analysis, state, index):
+        # the pairs of the event (candidate indices in the batch), as
+        #     indices into good_muons, in the order of build_dimuon_pairs
+        first, second, event = state['dimuon_pairs']
+        lo, hi = numpy.searchsorted(event, [index, index+1])
+        start = state['muon_offsets'][index]
+        position = dict((muon.entry, k)
+            for k, muon in enumerate(analysis.good_muons))
+        pairs = sorted(tuple(sorted((position[i - start], position[j - start])))
+            for i, j in zip(first[lo:hi].tolist(), second[lo:hi].tolist()))
+        muons = analysis.good_muons
+        analysis.dimuon_pairs += [(i, j) if muons[i].pt() > muons[j].pt()
+            else (j, i) for i, j in pairs]
+
+    #############################
+    # DIELECTRON and DIJET PAIRS
+    #############################
+    def build_other_pairs(analysis, state):
+        if numpy is None: return build_other_pairs_loop(analysis, state)
+        # electron pair cuts
+        pairs = CandidatePairs(analysis.good_electrons)
+        analysis.dielectron_pairs += pairs.ordered(
+            ~(pairs.charge_product() > 0))
+
+        # all jet pairs; the arrays are kept for get_event_category
+        pairs = CandidatePairs(analysis.good_jets,
+            lambda jet: jet.pt(analysis.jet_shift))
+        analysis.dijet_pairs += pairs.ordered()
+        analysis.dijet_arrays = pairs
+
+    def build_other_pairs_loop(analysis, state):
+        # iterate over every pair of electrons
+        for p in itertools.combinations(enumerate(analysis.good_electrons), 2):
+            (i, elec_i), (j, elec_j) = p
+
+            # electron pair cuts
+            if elec_i.charge() * elec_j.charge() > 0: continue
+            #if abs(elec_i.dz() - elec_j.dz()) > 0.14: continue
+
+            goodpair = (i, j) if elec_i.pt() > elec_j.pt() else (j, i)
+            analysis.dielectron_pairs += [goodpair]
+
+        for p in itertools.combinations(enumerate(analysis.good_jets), 2):
+            (i, jet_i), (j, jet_j) = p
+
+            goodpair = ((i, j) if jet_i.pt(analysis.jet_shift)
+                > jet_j.pt(analysis.jet_shift) else (j, i))
+            analysis.dijet_pairs += [goodpair]
+
+
+    return Selection([
+        # event selection
+        Cut('Trigger', passes_trigger, passes_trigger_batch,
+            'nEv_Trigger', 'Trigger'),
+        Cut('Vertex', good_vertex, good_vertex_batch),
+        # muon selection
+        Build('Muons', build_muons, build_muons_batch, muons_from_batch),
+        Counter('nEv_GAndTr', 'Global+Tracker muon', _flag('isGAndTr')),
+        Counter('nEv_Pt', 'Muon pT > {0}'.format(cuts['cMuPt']),
+            _flag('isPtCutOK')),
+        Counter('nEv_Eta', 'Muon |eta| < {0}'.format(cuts['cMuEta']),
+            _flag('isEtaCutOK')),
+        Cut('PtEtaMax', lambda analysis, state: state['nMuPtEtaMax'] >= 1,
+            counter='nEv_PtEtaMax', label='At least 1 trigger-matched mu with '
+            'pT > {0} and |eta| < {1}'.format(cuts['cMuPtMax'],
+                cuts['cMuEtaMax'])),
+        Counter('nEv_IDAndIso', 'Muon has {0} muon ID and {1} {2} '
+            'isolation'.format(cuts['cMuID'], cuts['cMuIsoLevel'],
+                cuts['cMuIsoType']), _flag('isIDAndIsoOK')),
+        Cut('2Mu', lambda analysis, state: state['nGoodMuons'] >= 2,
+            counter='nEv_2Mu', label='Require 2 "good" muons'),
+        # other objects
+        Build('Electrons', build_electrons, build_electrons_batch,
+            electrons_from_batch),
+        Build('Jets', build_jets),
+        # muon pair selection
+        Build('DimuonPairs', build_dimuon_pairs, build_dimuon_pairs_batch,
+            dimuon_pairs_from_batch),
+        Counter('nEv_ChargeDiMu', 'Dimu pair has opposite-sign mus',
+            _flag('isChargeMuCutOK')),
+        Counter('nEv_SamePVDiMu', 'Dimu pair has same pv mus',
+            _flag('isSamePVMuCutOK')),
+        Counter('nEv_InvMassDiMu', 'Dimu pair has invariant mass > '
+            '{0}'.format(cuts['cDiMuInvMass']), _flag('isInvMassMuCutOK')),
+        Counter('nEv_PtDiMu', 'Dimu pair has pT > {0}'.format(cuts['cDiMuPt']),
+            _flag('isPtDiMuCutOK')),
+        Cut('1DiMu', lambda analysis, state: state['nDimuonPairs'] >= 1,
+            counter='nEv_1DiMu', label='Require at least 1 "good" dimuon pair'),
+        Build('OtherPairs', build_other_pairs),
+        # preselection: 4 or fewer total isolated leptons
+        Cut('4Lep', lambda analysis, state:
+            state['nGoodMuons'] + state['nGoodElectrons'] <= 4),
+    ])
@@ -0,0 +1,145 @@
+# AnalysisToolLight/AnalysisTool/python/Skim.py
+'''
+Writes the events that pass event selection and preselection to a skim
+file that can be read back like any AC1B file (--write-skim).
+
+The skim has the same layout as the input files:
+    makeroottree/AC1B      : the passing entries, with only the active
+                             branches (use --prune-branches to drop the
+                             ones the analysis doesn't read)
+    makeroottree/AC1Binfo  : the info trees of the input files
+    makeroottree/AC1Blumi  : the lumi trees of the input files, so the
+                             number of events and summed weights (and so
+                             nEv_Orig, tNumEvts and tSumWts) are the same
+    makeroottree/SkimCutflow : what the rejected events added to each
+                             cutflow counter, added back when the skim is
+                             replayed so the cutflow table is unchanged
+    Summary                : the Summary tree of the skimming job
+'''
+import logging
+
+from ROOT import TFile, TH1D
+
+SKIM_CUTFLOW_NAME = 'SkimCutflow'
+
+
+## _____________________________________________________________________________
+class SkimWriter(object):
+    '''
+    Usage from the event loop:
+        skim.open_file(tfile, tree, count_lumis)  # for every input file
+        skim.begin_event(cutflow)                 # before the selection
+        skim.fill()                               # if the event passed
+        skim.close(cutflow, summary_tree)         # after the loop
+    '''
+    # constructors/helpers
+    def __init__(self, path, treedir, treename, infoname, luminame):
+        self.path = path
+        self.treedir = treedir
+        self.treename = treename
+        self.infoname = infoname
+        self.luminame = luminame
+
+        self.outfile = TFile(self.path, 'RECREATE')
+        self.outdir = self.outfile.mkdir(self.treedir)
+        self.outtree = None
+        self.infotree = None
+        self.lumitree = None
+        self.nfilled = 0
+        # counts added to the cutflow by rejected events
+        self.rejected = {}
+        self.before = None
+
+    def _copy(self, tree, outtree):
+        # the first tree is cloned, the others are appended to it
+        self.outdir.cd()
+        if outtree is None: return tree.CloneTree(-1)
+        outtree.CopyEntries(tree)
+        return outtree
+
+    # methods
+    ## _________________________________________________________________________
+    def open_file(self, tfile, tree, count_lumis=True):
+        '''
+        Points the skim at the event tree of a new input file and copies its
+        info and (if count_lumis) lumi trees.
+        '''
+        self.outdir.cd()
+        if self.outtree is None:
+            # only switched-on branches are cloned
+            self.outtree = tree.CloneTree(0)
+            logging.info('    Skim will keep {0} of {1} branches'.format(
+                self.outtree.GetListOfBranches().GetEntries(),
+                tree.GetListOfBranches().GetEntries()))
+        else:
+            # as a clone, the skim follows any branch address PyROOT sets
+            #     later on the input tree
+            tree.AddClone(self.outtree)
+            tree.CopyAddresses(self.outtree)
+
+        self.infotree = self._copy(tfile.Get('{0}/{1}'.format(self.treedir,
+            self.infoname)), self.infotree)
+        # same rule as the lumi totals in AnalysisBase: only the job with the
+        #     first entry of a file counts its lumis
+        if count_lumis:
+            self.lumitree = self._copy(tfile.Get('{0}/{1}'.format(self.treedir,
+                self.luminame)), self.lumitree)
+
+    ## _________________________________________________________________________
+    def begin_event(self, cutflow):
+        '''
+        Call before the event selection. Whatever the previous event added to
+        the cutflow is booked as rejected, unless fill() was called for it.
+        '''
+        self._book_rejected(cutflow)
+        self.before = dict(cutflow.counters)
+
+    def _book_rejected(self, cutflow):
+        if self.before is None: return
+        for name, count in cutflow.counters.iteritems():
+            diff = count - self.before.get(name, 0)
+            if diff: self.rejected[name] = self.rejected.get(name, 0) + diff
+        self.before = None
+
+    ## _________________________________________________________________________
+    def fill(self):
+        self.outtree.Fill()
+        self.nfilled += 1
+        self.before = None
+
+    ## _________________________________________________________________________
+    def close(self, cutflow, summary_tree):
+        self._book_rejected(cutflow)
+
+        self.outdir.cd()
+        names = [name for name in cutflow.get_names() if name in self.rejected]
+        hist = TH1D(SKIM_CUTFLOW_NAME, SKIM_CUTFLOW_NAME, max(1, len(names)),
+            0, max(1, len(names)))
+        for i, name in enumerate(names):
+            hist.GetXaxis().SetBinLabel(i+1, name)
+            hist.SetBinContent(i+1, self.rejected[name])
+        hist.Write()
+
+        for tree in [self.outtree, self.infotree, self.lumitree]:
+            if tree: tree.Write()
+
+        self.outfile.cd()
+        summary_tree.CloneTree(-1).Write()
+        self.outfile.Close()
+
+        logging.info('')
+        logging.info('Wrote {0} events to skim {1}'.format(self.nfilled,
+            self.path))
+
+
+## _____________________________________________________________________________
+def read_skim_cutflow(tfile, treedir):
+    '''
+    Returns {counter name : count} from the SkimCutflow histogram of a skim,
+    or None if tfile isn't a skim.
+    '''
+    hist = tfile.Get('{0}/{1}'.format(treedir, SKIM_CUTFLOW_NAME))
+    if not hist: return None
+    return dict((hist.GetXaxis().GetBinLabel(i), hist.GetBinContent(i))
+        for i in xrange(1, hist.GetNbinsX()+1)
+        if hist.GetXaxis().GetBinLabel(i))
@@ -394,13 +394,13 @@ def fill_category_hists(analysis, eventweight, fillcontrol, thiscat, pairindex1,
     this_kitten = '1' if (thiscat > 0 and thiscat < 4) else '2'
 
     mu1, mu2 = analysis.good_muons[pairindex1], analysis.good_muons[pairindex2]
-    dimu = mu1.p4() + mu2.p4()
+    dimu = mu1.four_vector() + mu2.four_vector()
     jet1, jet2, dijet = None, None, None
     if len(analysis.good_jets) > 0:
         jet1 = analysis.good_jets[0]
     if len(analysis.good_jets) > 1:
         jet2 = analysis.good_jets[1]
-        dijet = jet1.p4() + jet2.p4()
+        dijet = jet1.four_vector() + jet2.four_vector()
 
     ##########################################################
     #                                                        #
@@ -446,7 +446,7 @@ def fill_category_hists(analysis, eventweight, fillcontrol, thiscat, pairindex1,
     for i, j in analysis.dimuon_pairs:
         muon1 = analysis.good_muons[i]
         muon2 = analysis.good_muons[j]
-        dimuobj = muon1.p4() + muon2.p4()
+        dimuobj = muon1.four_vector() + muon2.four_vector()
 
         analysis.histograms_categories['hDiMuPt_'+this_cat].Fill(dimuobj.Pt(), eventweight)
         analysis.histograms_categories['hDiMuPt_cat00'].Fill(dimuobj.Pt(), eventweight)
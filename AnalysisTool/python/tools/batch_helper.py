@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 import os, sys
 import math
+import heapq
 from AnalysisToolLight.AnalysisTool.datasets import datasets80X
+from AnalysisToolLight.AnalysisTool.MetadataCache import collect_metadata
+from AnalysisToolLight.AnalysisTool.tools.tools import read_input_list, resolve_input_name
 
 scram = os.environ['CMSSW_BASE']
 basedir = scram + '/src/AnalysisToolLight'
@@ -95,6 +98,73 @@ def split_input_file(d, tmpdir):
 
 
 
+## ___________________________________________________________
+def plan_balanced_jobs(d, tmpdir, cachepath=datadir+'/metadata/metadata_cache.json',
+    workers=4):
+    '''
+    Alternative to split_input_file: writes the same job input lists, but
+    splits the dataset into d['njobs'] jobs with about the same number of
+    events each, using the entry count of every file (from the metadata
+    cache, see MetadataCache.py). Files with more events than one job
+    should get are split into entry ranges, which are written after the
+    file name as "first last" (inclusive) and read by AnalysisBase.
+    d['njobs'] is set to the number of jobs actually planned.
+    '''
+    inputfile = d['inputlist']
+    input_head = '{tmpdir}/job_{0}'.format(os.path.split(inputfile)[1][:-4], tmpdir=tmpdir)
+
+    entries = read_input_list(inputfile)
+    infos = collect_metadata([resolve_input_name(name) for name, first, last in entries],
+        'makeroottree', 'AC1Binfo', 'AC1Blumi', 'AC1B', cachepath, workers)
+
+    # list the files (or given entry ranges of files) with events
+    pieces = []
+    for i, ((name, first, last), info) in enumerate(zip(entries, infos)):
+        if info is None: continue # reported by collect_metadata
+        lo = first if first != -1 else 0
+        hi = last+1 if last != -1 else info['nentries']
+        if hi <= lo: continue # nothing to process in this file
+        pieces += [(i, name, lo, hi)]
+    total = sum(hi - lo for i, name, lo, hi in pieces)
+    if total == 0:
+        raise ValueError('No events found in {0}'.format(inputfile))
+    njobs = max(1, min(d['njobs'], total))
+    target = int(math.ceil(float(total)/njobs))
+
+    # cut files with more events than one job into pieces of at most half
+    #     a job, so the pieces can be packed evenly
+    maxpiece = int(math.ceil(target/2.))
+    split_pieces = []
+    for i, name, lo, hi in pieces:
+        nsplit = int(math.ceil(float(hi - lo)/maxpiece)) if hi - lo > target else 1
+        step = int(math.ceil(float(hi - lo)/nsplit))
+        for n in range(nsplit):
+            split_pieces += [(i, name, lo + n*step, min(hi, lo + (n+1)*step))]
+
+    # bin-pack: biggest pieces first, each into the job with fewest events
+    jobs = [[] for n in range(njobs)]
+    loads = [(0, n) for n in range(njobs)]
+    for piece in sorted(split_pieces, key=lambda p: p[3]-p[2], reverse=True):
+        load, n = heapq.heappop(loads)
+        jobs[n] += [piece]
+        heapq.heappush(loads, (load + piece[3] - piece[2], n))
+    jobs = [job for job in jobs if job]
+
+    d['njobs'] = len(jobs)
+    print 'planned {0} jobs for {1} events ({2} per job)'.format(len(jobs),
+        total, ', '.join(str(sum(p[3]-p[2] for p in job)) for job in jobs))
+
+    for n, job in enumerate(jobs):
+        with open('{0}_{1}of{2}.txt'.format(input_head, n2d(n+1), n2d(len(jobs))), 'w') as fout:
+            # keep the order of the original input list
+            for i, name, lo, hi in sorted(job):
+                if lo == 0 and hi == infos[i]['nentries']:
+                    fout.write('{0}\n'.format(name))
+                else:
+                    fout.write('{0} {1} {2}\n'.format(name, lo, hi-1))
+
+
+
 ## ___________________________________________________________
 def create_submission_scripts(d, dname, **kwargs):
     analysis     = kwargs['analysis']
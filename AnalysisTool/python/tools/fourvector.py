@@ -0,0 +1,101 @@
+'''
+Four-vectors in plain python (or numpy), for the hot paths where building
+and adding TLorentzVectors through PyROOT costs more than the arithmetic.
+
+FourVector follows the TLorentzVector conventions (and method names, so it
+can stand in for one): it's made from pt, eta, phi, m like SetPtEtaPhiM,
+added with +, and has M(), Pt(), Eta(), Phi(), E(), Px(), Py(), Pz().
+The components can be numbers or numpy arrays (one entry per candidate);
+with arrays every method returns an array.
+See scripts/checkFourVectors.py for the comparison with ROOT.
+'''
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+## ___________________________________________________________
+def _is_array(x):
+    return numpy is not None and isinstance(x, numpy.ndarray)
+
+
+## ___________________________________________________________
+class FourVector(object):
+    '''
+    (px, py, pz, e) four-vector; see the module docstring
+    '''
+    __slots__ = ('px', 'py', 'pz', 'e')
+    def __init__(self, px, py, pz, e):
+        self.px = px
+        self.py = py
+        self.pz = pz
+        self.e = e
+
+    @classmethod
+    def from_pt_eta_phi_m(cls, pt, eta, phi, m):
+        ''' Same as TLorentzVector.SetPtEtaPhiM '''
+        if _is_array(pt) or _is_array(eta) or _is_array(phi) or _is_array(m):
+            pt = numpy.abs(pt)
+            x, y, z = pt*numpy.cos(phi), pt*numpy.sin(phi), pt*numpy.sinh(eta)
+            m = numpy.asarray(m, dtype=float)
+            p2 = x*x+y*y+z*z
+            e = numpy.where(m >= 0, numpy.sqrt(p2+m*m),
+                numpy.sqrt(numpy.maximum(p2-m*m, 0.)))
+            return cls(x, y, z, e)
+        pt = abs(pt)
+        x, y, z = pt*math.cos(phi), pt*math.sin(phi), pt*math.sinh(eta)
+        if m >= 0: e = math.sqrt(x*x+y*y+z*z+m*m)
+        else:      e = math.sqrt(max(x*x+y*y+z*z-m*m, 0.))
+        return cls(x, y, z, e)
+
+    def __add__(self, other):
+        return FourVector(self.px+other.px, self.py+other.py,
+            self.pz+other.pz, self.e+other.e)
+
+    def __repr__(self):
+        return 'FourVector(px={0}, py={1}, pz={2}, e={3})'.format(self.px,
+            self.py, self.pz, self.e)
+
+    # methods
+    def Px(self): return self.px
+    def Py(self): return self.py
+    def Pz(self): return self.pz
+    def E(self):  return self.e
+
+    def M2(self):
+        return self.e*self.e - (self.px*self.px+self.py*self.py+self.pz*self.pz)
+
+    def M(self):
+        # like ROOT, a negative mass squared gives a negative mass
+        mm = self.M2()
+        if _is_array(mm):
+            return numpy.copysign(numpy.sqrt(numpy.abs(mm)), mm)
+        return -math.sqrt(-mm) if mm < 0 else math.sqrt(mm)
+
+    def Pt(self):
+        if _is_array(self.px):
+            return numpy.sqrt(self.px*self.px+self.py*self.py)
+        return math.sqrt(self.px*self.px+self.py*self.py)
+
+    def Phi(self):
+        if _is_array(self.px): return numpy.arctan2(self.py, self.px)
+        if self.px == 0 and self.py == 0: return 0.
+        return math.atan2(self.py, self.px)
+
+    def Eta(self):
+        # TVector3::PseudoRapidity, including what it does along the beam
+        if _is_array(self.px):
+            p = numpy.sqrt(self.px*self.px+self.py*self.py+self.pz*self.pz)
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                c = numpy.where(p == 0, 1., self.pz/numpy.where(p == 0, 1., p))
+                eta = -0.5*numpy.log((1.-c)/(1.+c))
+            return numpy.where(c*c < 1, eta, numpy.where(self.pz == 0, 0.,
+                numpy.where(self.pz > 0, 10e10, -10e10)))
+        p = math.sqrt(self.px*self.px+self.py*self.py+self.pz*self.pz)
+        c = 1. if p == 0 else self.pz/p
+        if c*c < 1: return -0.5*math.log((1.-c)/(1.+c))
+        if self.pz == 0: return 0.
+        return 10e10 if self.pz > 0 else -10e10
@@ -0,0 +1,71 @@
+'''
+All pairs of the candidates of an event as numpy index arrays, with the
+pair quantities (charge product, summed four-vector) computed for all pairs
+at once, for the dimuon, dielectron and dijet pairs of the selection:
+    pairs = CandidatePairs(analysis.good_muons)
+    ok = ~(pairs.charge_product() > 0) & ~(pairs.four_vector().M() < 60.)
+    analysis.dimuon_pairs += pairs.ordered(ok)
+The pairs come in the order of itertools.combinations(range(n), 2), and
+ordered() gives (leading, subleading) index tuples like the loops did:
+(i, j) if pt_i > pt_j else (j, i), with pt_i = pt(cands[i]) (pt() of the
+candidate by default; e.g. the JES-shifted pt for jets).
+See scripts/checkPairs.py for the comparison with the loops.
+'''
+from fourvector import FourVector
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+## ___________________________________________________________
+class CandidatePairs(object):
+    '''
+    The pairs (first[k], second[k]), first[k] < second[k], of cands, and
+    the pts that order them; see the module docstring
+    '''
+    __slots__ = ('cands', 'first', 'second', 'pts', 'p4')
+    def __init__(self, cands, pt=lambda cand: cand.pt()):
+        if numpy is None: raise ImportError('CandidatePairs needs numpy')
+        self.cands = cands
+        self.first, self.second = numpy.triu_indices(len(cands), 1)
+        self.pts = self.values(pt)
+        self.p4 = None
+
+    def __len__(self): return len(self.first)
+
+    def values(self, func):
+        ''' float64 array of func(cand) for each candidate '''
+        return numpy.array([func(cand) for cand in self.cands], dtype='float64')
+
+    def charge_product(self):
+        charge = self.values(lambda cand: cand.charge())
+        return charge[self.first] * charge[self.second]
+
+    def four_vector(self):
+        ''' FourVector of the sums cands[i].four_vector() + cands[j].four_vector()
+            of all pairs (computed once) '''
+        if self.p4 is None:
+            cand = FourVector.from_pt_eta_phi_m(
+                self.values(lambda cand: cand.pt()),
+                self.values(lambda cand: cand.eta()),
+                self.values(lambda cand: cand.phi()),
+                self.values(lambda cand: cand.mass()))
+            i, j = self.first, self.second
+            self.p4 = FourVector(cand.px[i]+cand.px[j], cand.py[i]+cand.py[j],
+                cand.pz[i]+cand.pz[j], cand.e[i]+cand.e[j])
+        return self.p4
+
+    def leading(self):
+        ''' Index arrays (leading, subleading) of the candidates of each pair '''
+        i, j = self.first, self.second
+        swap = ~(self.pts[i] > self.pts[j])
+        return numpy.where(swap, j, i), numpy.where(swap, i, j)
+
+    def ordered(self, mask=None):
+        ''' [(leading, subleading)] of the pairs where mask is True (all
+            pairs by default) '''
+        lead, sub = self.leading()
+        if mask is not None: lead, sub = lead[mask], sub[mask]
+        return zip(lead.tolist(), sub.tolist())
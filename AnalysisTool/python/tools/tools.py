@@ -4,6 +4,11 @@ import glob
 
 import ROOT
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # constants
 ## ___________________________________________________________
 Z_MASS = 91.1876 # GeV
@@ -29,6 +34,92 @@ def delta_r(c0, c1):
     dphi = delta_phi(c0, c1)
     return ROOT.TMath.Sqrt(deta**2+dphi**2)
 
+## ___________________________________________________________
+def delta_phi_array(phi0, phi1):
+    '''
+    delta_phi of numpy arrays (broadcast like phi0 - phi1), wrapped by the
+    same repeated 2 pi steps as the while loops of delta_phi, so the
+    results are identical
+    '''
+    pi = ROOT.TMath.Pi()
+    result = (numpy.asarray(phi0, dtype='float64')
+        - numpy.asarray(phi1, dtype='float64'))
+    over = result > pi
+    while over.any():
+        result = numpy.where(over, result - 2*pi, result)
+        over = result > pi
+    under = result <= -pi
+    while under.any():
+        result = numpy.where(under, result + 2*pi, result)
+        under = result <= -pi
+    return result
+
+## ___________________________________________________________
+def delta_r_matrix(cands0, cands1):
+    '''
+    numpy matrix of delta_r(cands0[i], cands1[j]) for all i, j
+    '''
+    eta0 = numpy.array([c.eta() for c in cands0], dtype='float64')
+    phi0 = numpy.array([c.phi() for c in cands0], dtype='float64')
+    eta1 = numpy.array([c.eta() for c in cands1], dtype='float64')
+    phi1 = numpy.array([c.phi() for c in cands1], dtype='float64')
+    deta = eta0[:,None] - eta1[None,:]
+    dphi = delta_phi_array(phi0[:,None], phi1[None,:])
+    return numpy.sqrt(deta**2+dphi**2)
+
+## ___________________________________________________________
+def cleaning_mask(cands, others, min_dr):
+    '''
+    For each of cands, whether it's at least min_dr away from all of others:
+    not any(delta_r(other, cand) < min_dr for other in others) (e.g. jets
+    cleaned against the good leptons). Computed as a whole delta_r_matrix
+    when numpy is available.
+    '''
+    if not cands or not others: return [True]*len(cands)
+    if numpy is None:
+        return [not any(delta_r(other, cand) < min_dr for other in others)
+            for cand in cands]
+    return ~(delta_r_matrix(others, cands) < min_dr).any(axis=0)
+
+
+
+# input file lists have one file per line, optionally followed by the
+# first and last (inclusive) entries of the file to process:
+# T2_CH_CERN/store/.../AC1B_1.root
+# T2_CH_CERN/store/.../AC1B_2.root 0 49999
+## ___________________________________________________________
+def read_input_list(inputlist):
+    '''
+    Returns a list of (name, first, last) for the files in inputlist, with
+    name as written in the list and first, last = -1, -1 for whole files.
+    '''
+    entries = []
+    with open(inputlist,'r') as f:
+        for line in f.readlines():
+            line = line.strip()
+            if line.startswith('#'): continue
+            if not line: continue
+            fields = line.split()
+            if len(fields) == 3:
+                entries += [(fields[0], int(fields[1]), int(fields[2]))]
+            elif len(fields) == 1:
+                entries += [(fields[0], -1, -1)]
+            else:
+                raise ValueError('Can\'t parse line "{0}" of {1}'.format(line,
+                    inputlist))
+    return entries
+
+## ___________________________________________________________
+def resolve_input_name(name):
+    '''
+    Turns personal storage options into xrootd urls.
+    '''
+    if name.startswith('T2_CH_CERN'):
+        return 'root://eoscms.cern.ch/{0}'.format(name[10:])
+    elif name.startswith('T2_US_UCSD'):
+        return 'root://xrootd.t2.ucsd.edu/{0}'.format(name[10:])
+    return name
+
 
 
 # eventlist must be a textfile with events listed as follows:
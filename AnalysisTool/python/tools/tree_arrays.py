@@ -0,0 +1,160 @@
+'''
+Bulk reads of TTree branches into numpy arrays.
+
+Branches are read with TTree::Draw (in "goff" mode) and the resulting
+buffers are copied out with numpy, so a whole tree (or entry range) is read
+in one call instead of one PyROOT GetEntry per entry. numpy is optional:
+without it, sum_branches falls back to the per-entry loop.
+TreeBatch gives a range of entries of a tree with the interface of
+ColumnarCache.ColumnarBatch (e.g. for Selection.run_batch).
+'''
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# TTree::Draw fills at most 4 value buffers (GetV1 ... GetV4) per call
+MAX_DRAW_VARS = 4
+
+# numpy types of the leaf types
+LEAF_DTYPES = {
+    'Bool_t'    : 'bool',
+    'Char_t'    : 'int8',
+    'UChar_t'   : 'uint8',
+    'Short_t'   : 'int16',
+    'UShort_t'  : 'uint16',
+    'Int_t'     : 'int32',
+    'UInt_t'    : 'uint32',
+    'Long64_t'  : 'int64',
+    'ULong64_t' : 'uint64',
+    'Float_t'   : 'float32',
+    'Double_t'  : 'float64',
+}
+
+
+## ___________________________________________________________
+def have_numpy():
+    return numpy is not None
+
+## ___________________________________________________________
+def _draw_buffer(buf, n):
+    # copy: the buffer belongs to the tree and is reused by the next Draw
+    buf.SetSize(n)
+    return numpy.frombuffer(buf, dtype=numpy.float64, count=n).copy()
+
+## ___________________________________________________________
+def read_branch_arrays(tree, branches, first=0, nentries=None):
+    '''
+    Returns a dict of branch name: numpy array (float64) with the values of
+    each branch for entries [first, first+nentries) of tree. For variable
+    length (array) branches the values of all entries are concatenated.
+    '''
+    if numpy is None:
+        raise ImportError('read_branch_arrays needs numpy')
+
+    total = tree.GetEntries()
+    if nentries is None or first + nentries > total:
+        nentries = max(0, total - first)
+
+    arrays = {}
+    for i in range(0, len(branches), MAX_DRAW_VARS):
+        chunk = branches[i:i+MAX_DRAW_VARS]
+        if nentries == 0:
+            for b in chunk: arrays[b] = numpy.zeros(0)
+            continue
+
+        # the Draw buffers only keep GetEstimate() rows. array branches can
+        #     have more rows than entries, so draw again if they didn't fit
+        tree.SetEstimate(nentries + 1)
+        n = tree.Draw(':'.join(chunk), '', 'goff', nentries, first)
+        if n > tree.GetEstimate():
+            tree.SetEstimate(n + 1)
+            n = tree.Draw(':'.join(chunk), '', 'goff', nentries, first)
+        if n < 0:
+            raise ValueError('read_branch_arrays: could not read '
+                '{0}'.format(', '.join(chunk)))
+
+        getters = [tree.GetV1, tree.GetV2, tree.GetV3, tree.GetV4]
+        for b, getter in zip(chunk, getters):
+            arrays[b] = _draw_buffer(getter(), n) if n else numpy.zeros(0)
+
+    return arrays
+
+## ___________________________________________________________
+class TreeBatch(object):
+    '''
+    Entries [first, last) of tree as whole arrays, like
+    ColumnarCache.ColumnarBatch: an attribute per branch (as float64), plus
+    size and offsets(counter), where the candidates of each entry start and
+    end. The given branches are read when the batch is made, a few per
+    TTree::Draw (see draw_groups); others when they are first used.
+    branches_read() lists what was read, e.g. to give it to the next batch.
+    '''
+    def __init__(self, tree, first, last, branches=()):
+        if numpy is None: raise ImportError('TreeBatch needs numpy')
+        self._tree = tree
+        self._first = first
+        self._offsets = {}
+        self._read = []
+        self.size = last - first
+        for names in draw_groups(tree, branches):
+            self.__dict__.update(read_branch_arrays(tree, names, first,
+                self.size))
+            self._read += names
+
+    def __getattr__(self, name):
+        if name.startswith('_'): raise AttributeError(name)
+        if not self._tree.GetBranch(name):
+            raise AttributeError('{0} is not in the tree'.format(name))
+        value = read_branch_arrays(self._tree, [name], self._first,
+            self.size)[name]
+        self.__dict__[name] = value
+        self._read.append(name)
+        return value
+
+    def branches_read(self):
+        return list(self._read)
+
+    def offsets(self, counter):
+        if counter not in self._offsets:
+            offsets = numpy.zeros(self.size+1, dtype='int64')
+            offsets[1:] = numpy.cumsum(getattr(self, counter).astype('int64'))
+            self._offsets[counter] = offsets
+        return self._offsets[counter]
+
+## ___________________________________________________________
+def draw_groups(tree, branches):
+    '''
+    Splits the branches of tree (ones it doesn't have are left out) into
+    lists that can be drawn together: the same count branch (collections)
+    or the same fixed length (scalars, fixed size arrays), since Draw gives
+    one row per value.
+    '''
+    groups = {}
+    for name in branches:
+        branch = tree.GetBranch(name)
+        leaves = branch.GetListOfLeaves() if branch else None
+        if not leaves or leaves.GetEntries() != 1: continue
+        leaf = leaves.At(0)
+        count = leaf.GetLeafCount()
+        key = (count.GetBranch().GetName() if count else None,
+            leaf.GetLenStatic())
+        groups.setdefault(key, []).append(name)
+    return [sorted(names) for key, names in sorted(groups.iteritems())]
+
+## ___________________________________________________________
+def sum_branches(tree, branches):
+    '''
+    Returns a list with the sum of each branch over all entries of tree.
+    '''
+    if numpy is not None:
+        arrays = read_branch_arrays(tree, branches)
+        return [arrays[b].sum() for b in branches]
+
+    sums = [0 for b in branches]
+    for entry in xrange(tree.GetEntries()):
+        tree.GetEntry(entry)
+        for i, b in enumerate(branches):
+            sums[i] += getattr(tree, b)
+    return sums
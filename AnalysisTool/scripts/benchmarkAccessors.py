@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+'''
+Compares the per-call cost of reading muon variables through the
+precompiled accessor tables of Dataform (BranchTable) with the old
+string-format path, getattr(tree, '{0}_{1}'.format(candName, var))[i],
+on a synthetic AC1B-like tree.
+
+    python benchmarkAccessors.py [-n NEVENTS] [-m MUONS]
+'''
+import argparse
+import os, sys
+import tempfile
+import time
+from array import array
+from ROOT import TFile, TTree, gROOT, TRandom3
+from AnalysisToolLight.AnalysisTool.Dataform import Muon
+
+gROOT.SetBatch(True)
+
+ISO_VARS = ['pt', 'pfisolationr4_sumchargedhadronpt',
+    'pfisolationr4_sumneutralhadronet', 'pfisolationr4_sumphotonet',
+    'pfisolationr4_sumpupt']
+
+
+## ___________________________________________________________
+def make_muon_file(fname, nevents, maxmuons):
+    tfile = TFile(fname, 'RECREATE')
+    tdir = tfile.mkdir('makeroottree')
+    tdir.cd()
+    tree = TTree('AC1B', 'AC1B')
+    count = array('I', [0])
+    tree.Branch('muon_count', count, 'muon_count/i')
+    buffers = {}
+    for var in ISO_VARS:
+        buffers[var] = array('f', [0.]*maxmuons)
+        tree.Branch('muon_'+var, buffers[var],
+            'muon_{0}[muon_count]/F'.format(var))
+    rand = TRandom3(1)
+    for i in xrange(nevents):
+        count[0] = rand.Integer(maxmuons+1)
+        for var in ISO_VARS:
+            for m in xrange(count[0]):
+                buffers[var][m] = rand.Exp(20.)
+        tree.Fill()
+    tree.Write()
+    tfile.Close()
+
+## ___________________________________________________________
+def old_get(tree, entry, var):
+    return getattr(tree, '{0}_{1}'.format('muon', var))[entry]
+
+## ___________________________________________________________
+def old_iso(tree, entry):
+    return (old_get(tree, entry, 'pfisolationr4_sumchargedhadronpt')
+        + max(0., (old_get(tree, entry, 'pfisolationr4_sumneutralhadronet')
+                   + old_get(tree, entry, 'pfisolationr4_sumphotonet')
+                   - 0.5 * old_get(tree, entry, 'pfisolationr4_sumpupt')))
+        ) / old_get(tree, entry, 'pt')
+
+## ___________________________________________________________
+def run(tree, make, func):
+    '''
+    Calls func(make(tree, i)) for every muon of every event; returns the
+    time per call (excluding GetEntry and make) and the sum of the results.
+    '''
+    elapsed, ncalls, total = 0., 0, 0.
+    for entry in xrange(tree.GetEntries()):
+        tree.GetEntry(entry)
+        cands = [make(tree, i) for i in xrange(tree.muon_count)]
+        start = time.time()
+        for cand in cands:
+            total += func(cand)
+        elapsed += time.time() - start
+        ncalls += len(cands)
+    return elapsed / max(1, ncalls), total
+
+
+## ___________________________________________________________
+def main(argv=None):
+    if argv is None: argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--nevents', type=int, default=20000)
+    parser.add_argument('-m', '--muons', type=int, default=6,
+        help='Maximum number of muons per event')
+    args = parser.parse_args(argv)
+
+    fname = os.path.join(tempfile.mkdtemp(), 'muons.root')
+    make_muon_file(fname, args.nevents, args.muons)
+    tfile = TFile.Open(fname)
+    tree = tfile.Get('makeroottree/AC1B')
+
+    old = lambda t, i: (t, i)
+    new = lambda t, i: Muon(t, i, False)
+    tests = [
+        ('pt, string format', old, lambda c: old_get(c[0], c[1], 'pt')),
+        ('pt, accessor table', new, lambda c: c._get('pt')),
+        ('iso_PFr4dB_comb_rel, string format', old, lambda c: old_iso(*c)),
+        ('iso_PFr4dB_comb_rel, accessor table', new,
+            lambda c: c.iso_PFr4dB_comb_rel()),
+    ]
+    results = [(name, run(tree, make, func)) for name, make, func in tests]
+    tfile.Close()
+    os.remove(fname)
+
+    print 'Events: {0}, up to {1} muons each'.format(args.nevents, args.muons)
+    for name, (percall, total) in results:
+        print '    {0:38s}: {1:8.3f} us/call  (sum {2:.6g})'.format(name,
+            percall*1e6, total)
+    return 0
+
+
+## ___________________________________________________________
+if __name__ == '__main__':
+    sys.exit(main())
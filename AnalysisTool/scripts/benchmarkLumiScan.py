@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+'''
+Compares the per-entry GetEntry loop that AnalysisBase used to count events
+and sum weights over the AC1Blumi tree with the bulk array read from
+tools/tree_arrays.py, on a synthetic file with many lumi sections.
+
+    python benchmarkLumiScan.py [-n NUMLUMIS] [-r REPEATS]
+'''
+import argparse
+import os, sys
+import tempfile
+import time
+from array import array
+from ROOT import TFile, TTree, gROOT, TRandom3
+from AnalysisToolLight.AnalysisTool.tools.tree_arrays import sum_branches, have_numpy
+
+gROOT.SetBatch(True)
+
+
+## ___________________________________________________________
+def make_lumi_file(fname, numlumis):
+    tfile = TFile(fname, 'RECREATE')
+    tdir = tfile.mkdir('makeroottree')
+    tdir.cd()
+    tree = TTree('AC1Blumi', 'AC1Blumi')
+    nevents = array('I', [0])
+    sumweights = array('f', [0.])
+    tree.Branch('lumi_nevents', nevents, 'lumi_nevents/i')
+    tree.Branch('lumi_sumweights', sumweights, 'lumi_sumweights/F')
+    rand = TRandom3(1)
+    for i in xrange(numlumis):
+        nevents[0] = int(rand.Uniform(100, 2000))
+        sumweights[0] = nevents[0] * rand.Gaus(1., 0.1)
+        tree.Fill()
+    tree.Write()
+    tfile.Close()
+
+## ___________________________________________________________
+def loop_sums(tree):
+    nevents, sumweights = 0, 0.
+    for entry in xrange(tree.GetEntries()):
+        tree.GetEntry(entry)
+        nevents += tree.lumi_nevents
+        sumweights += tree.lumi_sumweights
+    return nevents, sumweights
+
+## ___________________________________________________________
+def bulk_sums(tree):
+    return sum_branches(tree, ['lumi_nevents', 'lumi_sumweights'])
+
+## ___________________________________________________________
+def time_it(func, tree, repeats):
+    best = None
+    for r in xrange(repeats):
+        start = time.time()
+        result = func(tree)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+## ___________________________________________________________
+def main(argv=None):
+    if argv is None: argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--numlumis', type=int, default=5000)
+    parser.add_argument('-r', '--repeats', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if not have_numpy():
+        print 'numpy is not available: nothing to compare against.'
+        return 1
+
+    fname = os.path.join(tempfile.mkdtemp(), 'lumis.root')
+    make_lumi_file(fname, args.numlumis)
+
+    tfile = TFile.Open(fname)
+    tree = tfile.Get('makeroottree/AC1Blumi')
+    loop_time, loop_result = time_it(loop_sums, tree, args.repeats)
+    bulk_time, bulk_result = time_it(bulk_sums, tree, args.repeats)
+    tfile.Close()
+    os.remove(fname)
+
+    print 'Lumi sections: {0} (best of {1})'.format(args.numlumis, args.repeats)
+    print '    GetEntry loop : {0:8.4f} s  nevents={1} sumweights={2:.1f}'.format(
+        loop_time, loop_result[0], loop_result[1])
+    print '    bulk arrays   : {0:8.4f} s  nevents={1} sumweights={2:.1f}'.format(
+        bulk_time, int(round(bulk_result[0])), bulk_result[1])
+    print '    speedup       : {0:.1f}x'.format(loop_time / bulk_time)
+    return 0
+
+
+## ___________________________________________________________
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+'''
+Checks that tools.delta_r_matrix and cleaning_mask give exactly the same
+numbers as the per-pair tools.delta_r (including the delta phi wrapping
+at +-pi) on random candidates plus some edge cases.
+Returns 1 if anything differs.
+
+    python checkDeltaR.py [-n NCANDS]
+'''
+import argparse
+import math
+import sys
+from ROOT import TRandom3
+from AnalysisToolLight.AnalysisTool.tools.tools import delta_r, \
+    delta_r_matrix, cleaning_mask
+
+
+## ___________________________________________________________
+class Cand(object):
+    ''' eta() and phi() are all delta_r needs '''
+    def __init__(self, eta, phi):
+        self._eta, self._phi = eta, phi
+    def eta(self): return self._eta
+    def phi(self): return self._phi
+
+
+## ___________________________________________________________
+def main(argv=None):
+    if argv is None: argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--ncands', type=int, default=300)
+    args = parser.parse_args(argv)
+
+    rand = TRandom3(1)
+    cands = [Cand(rand.Uniform(-4.7, 4.7), rand.Uniform(-math.pi, math.pi))
+        for i in xrange(args.ncands)]
+    # phi on and just beyond the boundaries (float32 rounding of pi is
+    #     above pi), and angles a few turns away
+    cands += [Cand(0., phi) for phi in (math.pi, -math.pi, 3.1415927410125732,
+        -3.1415927410125732, 0., 7., -7., 20.)]
+
+    matrix = delta_r_matrix(cands, cands)
+    ndiff = sum(1 for i, c0 in enumerate(cands) for j, c1 in enumerate(cands)
+        if matrix[i, j] != delta_r(c0, c1))
+
+    leptons, jets = cands[:4], cands[4:]
+    mask = cleaning_mask(jets, leptons, 0.4)
+    nmask = sum(1 for jet, clean in zip(jets, mask)
+        if bool(clean) != (not any(delta_r(l, jet) < 0.4 for l in leptons)))
+
+    print 'delta_r differences: {0} of {1} pairs'.format(ndiff, len(cands)**2)
+    print 'cleaning differences: {0} of {1} jets'.format(nmask, len(jets))
+    failed = ndiff or nmask
+    print 'FAILED' if failed else 'OK'
+    return 1 if failed else 0
+
+
+## ___________________________________________________________
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+'''
+Checks that tools/fourvector.py agrees with TLorentzVector: builds random
+pairs of candidates from pt, eta, phi, m, adds them, and compares M, Pt,
+Eta, Phi and E of the sums (scalar and numpy array versions) with ROOT.
+Returns 1 if any relative difference is above the tolerance.
+
+    python checkFourVectors.py [-n NPAIRS] [-t TOLERANCE]
+'''
+import argparse
+import sys
+from ROOT import TLorentzVector, TRandom3
+from AnalysisToolLight.AnalysisTool.tools.fourvector import FourVector
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+QUANTITIES = ['M', 'Pt', 'Eta', 'Phi', 'E']
+
+
+## ___________________________________________________________
+def random_candidates(n, seed=1):
+    rand = TRandom3(seed)
+    cands = []
+    for i in xrange(n):
+        # muon-like and jet-like masses, with some massless candidates
+        m = [0., 0.105658, rand.Uniform(0., 50.)][rand.Integer(3)]
+        cands += [(rand.Exp(40.), rand.Uniform(-4.7, 4.7),
+            rand.Uniform(-3.14159, 3.14159), m)]
+    return cands
+
+## ___________________________________________________________
+def root_sum(c1, c2):
+    p1, p2 = TLorentzVector(), TLorentzVector()
+    p1.SetPtEtaPhiM(*c1)
+    p2.SetPtEtaPhiM(*c2)
+    s = p1 + p2
+    return [getattr(s, q)() for q in QUANTITIES]
+
+## ___________________________________________________________
+def relative_difference(a, b):
+    return abs(a - b) / max(1., abs(a), abs(b))
+
+
+## ___________________________________________________________
+def main(argv=None):
+    if argv is None: argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--npairs', type=int, default=100000)
+    parser.add_argument('-t', '--tolerance', type=float, default=1e-9)
+    args = parser.parse_args(argv)
+
+    first = random_candidates(args.npairs, 1)
+    second = random_candidates(args.npairs, 2)
+    expected = [root_sum(c1, c2) for c1, c2 in zip(first, second)]
+
+    # scalars
+    worst = dict((q, 0.) for q in QUANTITIES)
+    for c1, c2, exp in zip(first, second, expected):
+        s = FourVector.from_pt_eta_phi_m(*c1) + FourVector.from_pt_eta_phi_m(*c2)
+        for q, value in zip(QUANTITIES, exp):
+            worst[q] = max(worst[q], relative_difference(getattr(s, q)(), value))
+    results = [('scalar', worst)]
+
+    # arrays
+    if numpy is not None:
+        a1 = [numpy.array(x) for x in zip(*first)]
+        a2 = [numpy.array(x) for x in zip(*second)]
+        s = FourVector.from_pt_eta_phi_m(*a1) + FourVector.from_pt_eta_phi_m(*a2)
+        exp = numpy.array(expected)
+        worst = {}
+        for i, q in enumerate(QUANTITIES):
+            diff = numpy.abs(getattr(s, q)() - exp[:,i]) / numpy.maximum(1.,
+                numpy.maximum(numpy.abs(getattr(s, q)()), numpy.abs(exp[:,i])))
+            worst[q] = diff.max()
+        results += [('array', worst)]
+    else:
+        print 'numpy is not available: only checking scalars.'
+
+    failed = False
+    print 'Largest relative differences to TLorentzVector ({0} pairs):'.format(
+        args.npairs)
+    for name, worst in results:
+        print '    {0:6s}: {1}'.format(name, '  '.join('{0}={1:.2e}'.format(q,
+            worst[q]) for q in QUANTITIES))
+        failed = failed or any(worst[q] > args.tolerance for q in QUANTITIES)
+    print 'FAILED' if failed else 'OK'
+    return 1 if failed else 0
+
+
+## ___________________________________________________________
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+'''
+Checks that tools.pairs.CandidatePairs gives the same pairs, in the same
+order, and the same flags as the per-pair loops of the selection
+(itertools.combinations, one four-vector per pair) on random events:
+dimuon charge/mass/pT flags and pairs, ordering by another pt (like the
+JES-shifted jet pt), and the VBF/GGF tight dijet conditions.
+Returns 1 if anything differs.
+
+    python checkPairs.py [-n NEVENTS]
+'''
+import argparse
+import itertools
+import math
+import sys
+from ROOT import TRandom3
+from AnalysisToolLight.AnalysisTool.tools.fourvector import FourVector
+from AnalysisToolLight.AnalysisTool.tools.pairs import CandidatePairs
+
+
+## ___________________________________________________________
+class Cand(object):
+    ''' What the pair builders use of a muon or jet '''
+    def __init__(self, pt, shifted_pt, eta, phi, mass, charge):
+        self._pt, self._shifted_pt = pt, shifted_pt
+        self._eta, self._phi, self._mass, self._charge = eta, phi, mass, charge
+    def pt(self, shift=''): return self._shifted_pt if shift else self._pt
+    def eta(self):    return self._eta
+    def phi(self):    return self._phi
+    def mass(self):   return self._mass
+    def charge(self): return self._charge
+    def four_vector(self):
+        return FourVector.from_pt_eta_phi_m(self.pt(), self.eta(), self.phi(),
+            self.mass())
+
+
+## ___________________________________________________________
+def loop_pairs(cands, min_mass, min_pt):
+    ''' The loops of the selection: (flags, pairs, dijet flags) '''
+    charge_ok = mass_ok = pt_ok = False
+    pairs, ordered = [], []
+    vbf = ggf = False
+    for (i, c_i), (j, c_j) in itertools.combinations(enumerate(cands), 2):
+        ordered += [(i, j) if c_i.pt('Up') > c_j.pt('Up') else (j, i)]
+        p4 = c_i.four_vector() + c_j.four_vector()
+        lead, sub = [cands[k] for k in ordered[-1]]
+        if lead.pt('Up') > 40. and sub.pt('Up') > 30.:
+            vbf = vbf or (p4.M() > 650. and abs(lead.eta() - sub.eta()) > 3.5)
+            ggf = ggf or p4.M() > 250.
+        if c_i.charge() * c_j.charge() > 0: continue
+        charge_ok = True
+        if p4.M() < min_mass: continue
+        mass_ok = True
+        if p4.Pt() < min_pt: continue
+        pt_ok = True
+        pairs += [(i, j) if c_i.pt() > c_j.pt() else (j, i)]
+    return (charge_ok, mass_ok, pt_ok), pairs, ordered, (vbf, ggf)
+
+## ___________________________________________________________
+def array_pairs(cands, min_mass, min_pt):
+    ''' The same with CandidatePairs '''
+    pairs = CandidatePairs(cands)
+    p4 = pairs.four_vector()
+    passed = ~(pairs.charge_product() > 0)
+    flags = [passed.any()]
+    passed &= ~(p4.M() < min_mass)
+    flags += [passed.any()]
+    passed &= ~(p4.Pt() < min_pt)
+    flags += [passed.any()]
+
+    shifted = CandidatePairs(cands, lambda cand: cand.pt('Up'))
+    lead, sub = shifted.leading()
+    pts_ok = (shifted.pts[lead] > 40.) & (shifted.pts[sub] > 30.)
+    eta = shifted.values(lambda cand: cand.eta())
+    mass = shifted.four_vector().M()
+    vbf = (pts_ok & (mass > 650.) & (abs(eta[lead] - eta[sub]) > 3.5)).any()
+    ggf = (pts_ok & (mass > 250.)).any()
+    return (tuple(bool(f) for f in flags), pairs.ordered(passed),
+        shifted.ordered(), (bool(vbf), bool(ggf)))
+
+
+## ___________________________________________________________
+def main(argv=None):
+    if argv is None: argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--nevents', type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    rand = TRandom3(1)
+    ndiff = 0
+    for ievent in xrange(args.nevents):
+        cands = []
+        for k in xrange(rand.Integer(7)):
+            # some equal pts, to check the order of ties
+            pt = rand.Exp(40.) if rand.Rndm() > 0.1 else 50.
+            cands += [Cand(pt, pt * rand.Gaus(1., 0.05), rand.Uniform(-4.7, 4.7),
+                rand.Uniform(-math.pi, math.pi), rand.Uniform(0., 20.),
+                [-1, 1][rand.Integer(2)])]
+        expected = loop_pairs(cands, 60., 10.)
+        result = array_pairs(cands, 60., 10.)
+        if result != expected:
+            ndiff += 1
+            if ndiff <= 5:
+                print 'event {0}: loops {1}'.format(ievent, expected)
+                print '    arrays {0}'.format(result)
+
+    print 'differences: {0} of {1} events'.format(ndiff, args.nevents)
+    print 'FAILED' if ndiff else 'OK'
+    return 1 if ndiff else 0
+
+
+## ___________________________________________________________
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+'''
+Checks that two analysis output files have the same histograms, bin by bin
+(e.g. a run over the full sample and a run over its skim, see --write-skim).
+Prints every histogram that differs and returns 1 if any do.
+
+    python compareHistograms.py full.root replay.root [-t TOLERANCE]
+'''
+import argparse
+import sys
+from ROOT import TFile, TH1, gROOT
+
+gROOT.SetBatch(True)
+
+
+## ___________________________________________________________
+def collect_histograms(tdir, prefix=''):
+    hists = {}
+    for key in tdir.GetListOfKeys():
+        obj = key.ReadObj()
+        name = prefix + key.GetName()
+        if obj.InheritsFrom('TDirectory'):
+            hists.update(collect_histograms(obj, name + '/'))
+        elif obj.InheritsFrom('TH1'):
+            hists[name] = obj
+    return hists
+
+## ___________________________________________________________
+def histograms_differ(h1, h2, tolerance):
+    if h1.GetNcells() != h2.GetNcells(): return 'different binning'
+    for i in xrange(h1.GetNcells()):
+        for get in ['GetBinContent', 'GetBinError']:
+            a, b = getattr(h1, get)(i), getattr(h2, get)(i)
+            if abs(a - b) > tolerance*max(1., abs(a), abs(b)):
+                return 'bin {0}: {1} {2} vs {3}'.format(i, get[3:], a, b)
+    return ''
+
+
+## ___________________________________________________________
+def main(argv=None):
+    if argv is None: argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('file1', type=str)
+    parser.add_argument('file2', type=str)
+    parser.add_argument('-t', '--tolerance', type=float, default=0.,
+        help='Relative tolerance on bin contents and errors (default: exact)')
+    args = parser.parse_args(argv)
+
+    TH1.AddDirectory(False)
+    f1, f2 = TFile.Open(args.file1), TFile.Open(args.file2)
+    hists1, hists2 = collect_histograms(f1), collect_histograms(f2)
+
+    ndiff = 0
+    for name in sorted(set(hists1) | set(hists2)):
+        if name not in hists1 or name not in hists2:
+            print '{0}: only in {1}'.format(name,
+                args.file1 if name in hists1 else args.file2)
+            ndiff += 1
+            continue
+        diff = histograms_differ(hists1[name], hists2[name], args.tolerance)
+        if diff:
+            print '{0}: {1}'.format(name, diff)
+            ndiff += 1
+
+    print '{0} histograms compared, {1} differ'.format(
+        len(set(hists1) | set(hists2)), ndiff)
+    return 1 if ndiff else 0
+
+
+## ___________________________________________________________
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+'''
+Writes the columnar cache (see ColumnarCache.py) of the input files in an
+input list, with the event tree branches listed in a branch list (as
+written by AnalysisBase --record-branches). Files that are already in the
+cache and haven't changed are skipped. Run the analysis on it with
+--columnar-cache CACHEDIR (and the same input list).
+
+    python makeColumnarCache.py -i INPUTLIST -b BRANCHLIST -o CACHEDIR [-j N]
+'''
+import argparse
+import logging
+import multiprocessing
+import os, sys
+from ROOT import gROOT
+from AnalysisToolLight.AnalysisTool.ColumnarCache import convert_file, \
+    read_manifest
+from AnalysisToolLight.AnalysisTool.BranchUsage import read_branch_list
+from AnalysisToolLight.AnalysisTool.tools.tools import read_input_list, \
+    resolve_input_name
+
+gROOT.SetBatch(True)
+
+
+## ___________________________________________________________
+def convert_worker(task):
+    fname, treepath, branches, cachedir = task
+    try:
+        convert_file(fname, treepath, branches, cachedir)
+        return None
+    except Exception as e:
+        return '{0}: {1}: {2}'.format(fname, type(e).__name__, e)
+
+
+## ___________________________________________________________
+def main(argv=None):
+    if argv is None: argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-i', '--input_file_list', type=str, required=True)
+    parser.add_argument('-b', '--branch-list', type=str, required=True,
+        help='Branches to store (written by --record-branches)')
+    parser.add_argument('-o', '--cache-dir', type=str, required=True)
+    parser.add_argument('-t', '--tree', type=str, default='makeroottree/AC1B')
+    parser.add_argument('-j', '--workers', type=int, default=4)
+    parser.add_argument('--force', action='store_true',
+        help='Convert files even if they are already in the cache')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr,
+        format='[%(asctime)s]   %(message)s', datefmt='%Y-%m-%d %H:%M')
+
+    if not os.path.exists(args.cache_dir): os.makedirs(args.cache_dir)
+    branches = read_branch_list(args.branch_list)
+    # the whole file is converted, whatever entry range the list gives
+    filenames = [resolve_input_name(name)
+        for name, first, last in read_input_list(args.input_file_list)]
+    todo = [fname for fname in filenames
+        if args.force or read_manifest(args.cache_dir, fname) is None]
+    logging.info('Converting {0} of {1} files ({2} branches)'.format(len(todo),
+        len(filenames), len(branches)))
+
+    tasks = [(fname, args.tree, branches, args.cache_dir) for fname in todo]
+    if args.workers > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(args.workers, len(tasks)))
+        try:
+            errors = pool.map(convert_worker, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        errors = [convert_worker(task) for task in tasks]
+
+    errors = [e for e in errors if e]
+    for error in errors:
+        logging.info('    FAILED: {0}'.format(error))
+    logging.info('Done: {0} converted, {1} failed'.format(
+        len(tasks) - len(errors), len(errors)))
+    return 1 if errors else 0
+
+
+## ___________________________________________________________
+if __name__ == '__main__':
+    sys.exit(main())
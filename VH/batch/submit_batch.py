@@ -26,7 +26,10 @@ def wrapper(args):
 
     # split inputfile into temp input files
     for dname, d in dataset_map.iteritems():
-        split_input_file(d, tmpdir)
+        if args.balance:
+            plan_balanced_jobs(d, tmpdir)
+        else:
+            split_input_file(d, tmpdir)
 
     # build options map for sub scripts
     options = {
@@ -104,6 +107,7 @@ def parse_command_line(argv):
     parser.add_argument('-a', '--analysis', type=str, help='Analysis to perform', choices=['VH2Mu'], required=True)
     parser.add_argument('-v', '--version',  type=str, help='CMSSW version used to make ntuples', choices=['76X','80X'], required=True)
     parser.add_argument('--mail', action='store_true', help='Send mail upon job completion')
+    parser.add_argument('--balance', action='store_true', help='Split datasets into jobs with equal numbers of events')
 
     return parser.parse_args(argv)
 